@@ -1,60 +1,86 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Body, Request, BackgroundTasks, Depends, Form
+from fastapi import FastAPI, UploadFile, File, HTTPException, Body, Request, Depends, Form, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field, EmailStr
+import asyncio
+import hashlib
+import logging
+import os
 import shutil
 from pathlib import Path
 import traceback
-from langchain_core.callbacks import BaseCallbackHandler
 from typing import Dict, Any, List
-from uuid import UUID
-from typing import List, Dict, Optional, Any, Annotated, AsyncGenerator, Set
+from uuid import uuid4
+from typing import List, Dict, Optional, Any, Annotated, AsyncGenerator, Literal, Set
+from collections import OrderedDict
 from contextlib import asynccontextmanager
+from functools import lru_cache
 import weaviate
-from weaviate.classes.init import Auth
+from weaviate.classes.init import AdditionalConfig, Auth, Timeout
+from weaviate.config import ConnectionConfig
 from weaviate.collections.classes.tenants import Tenant
 from langchain_core.runnables import Runnable, RunnableConfig
 from langchain_core.documents import Document
-import json
-from fastapi.responses import StreamingResponse, FileResponse, RedirectResponse
+import orjson
+from fastapi.responses import StreamingResponse, FileResponse, RedirectResponse, ORJSONResponse
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 from passlib.context import CryptContext
+from bson import ObjectId
 
 # AWS SDK
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 import io # For BytesIO with upload_fileobj if needed, or directly passing file.file
 
 from .ragbase.chain import create_chain, save_message_pair
 from .ragbase import ingest
 from .ragbase.config import Config 
-from .ragbase.retriever import create_retriever
-from .ragbase.model import create_llm
-from .ragbase.ingest import COLLECTION_NAME
+from .ragbase.model import create_llm, warm_up_models
+from .ragbase.ingest import COLLECTION_NAME, SUPPORTED_EXTENSIONS
 from .database import mongo_handler
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # -----------------------------
 # --- Dependency to get Weaviate client --- 
-def get_weaviate_client_dependency(request: Request):
-    """Dependency function to get the client from app state."""
+async def get_weaviate_client_dependency(request: Request) -> weaviate.WeaviateClient:
+    """Dependency function to get the client from app state.
+
+    Async because it only reads app.state: FastAPI runs sync dependencies in its threadpool.
+    """
     client = getattr(request.app.state, 'weaviate_client', None)
     if client is None:
          print("ERROR: Weaviate client dependency failed - client not initialized in app state.")
          raise HTTPException(status_code=503, detail="Weaviate client not available")
     return client
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # --- STARTUP --- 
-    print("--- Application Startup --- ")
-    
-    # Local directory clearing removed as S3 is primary for documents
-    # and processed_hashes.json is obsolete with Weaviate's direct hash checking.
+# --- Dependency to get the shared S3 client ---
+@lru_cache(maxsize=1)
+def _create_s3_client():
+    # boto3 clients are thread-safe; build one per process instead of one per request
+    return boto3.client('s3', region_name=Config.AWS.S3_REGION, config=boto3.session.Config(signature_version='s3v4'))
+
+# Multipart settings for upload_fileobj: parts are read straight from the spooled upload and sent concurrently
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=Config.AWS.UPLOAD_MULTIPART_THRESHOLD_MB * 1024 * 1024,
+    multipart_chunksize=Config.AWS.UPLOAD_PART_SIZE_MB * 1024 * 1024,
+    max_concurrency=Config.AWS.UPLOAD_MAX_CONCURRENCY,
+    use_threads=True
+)
 
-    # Initialize Weaviate Client
-    app.state.weaviate_client = None 
+def get_s3_client_dependency():
+    """Dependency function returning the process-wide S3 client."""
+    try:
+        return _create_s3_client()
+    except Exception as e:
+        print(f"ERROR initializing AWS S3 client: {e}")
+        raise HTTPException(status_code=500, detail="Could not connect to Object Storage (S3).")
+
+def connect_weaviate() -> Optional[weaviate.WeaviateClient]:
+    """Connects to Weaviate Cloud and checks the collection (blocking). Returns None on failure."""
     print("Initializing Weaviate client at application startup...")
     weaviate_url = Config.Database.WEAVIATE_URL
     weaviate_key = Config.Database.WEAVIATE_API_KEY
@@ -62,38 +88,110 @@ async def lifespan(app: FastAPI):
     if not weaviate_url or not weaviate_key:
         print("ERROR: WEAVIATE_URL and WEAVIATE_API_KEY must be set for Weaviate mode.")
         # Consider if this should be a fatal error that stops startup
-    else:
-        try:
-            client_instance = weaviate.connect_to_wcs(
-                cluster_url=weaviate_url,
-                auth_credentials=Auth.api_key(weaviate_key)
-            )
-            print("Weaviate client connected and ready.")
-            app.state.weaviate_client = client_instance
+        return None
+    try:
+        client_instance = weaviate.connect_to_weaviate_cloud(
+            cluster_url=weaviate_url,
+            auth_credentials=Auth.api_key(weaviate_key),
+            additional_config=AdditionalConfig(
+                connection=ConnectionConfig(
+                    session_pool_connections=Config.Database.WEAVIATE_POOL_CONNECTIONS,
+                    session_pool_maxsize=Config.Database.WEAVIATE_POOL_MAXSIZE
+                ),
+                timeout=Timeout(
+                    init=Config.Database.WEAVIATE_TIMEOUT_INIT,
+                    query=Config.Database.WEAVIATE_TIMEOUT_QUERY,
+                    insert=Config.Database.WEAVIATE_TIMEOUT_INSERT
+                )
+            ),
+            skip_init_checks=Config.Database.WEAVIATE_SKIP_INIT_CHECKS
+        )
+        print("Weaviate client connected and ready.")
+        
+        collection_name = COLLECTION_NAME 
+        if not client_instance.collections.exists(collection_name):
+            print(f"Weaviate collection '{collection_name}' not found during startup. Will be created by ingest if needed.")
+        else:
+            print(f"Weaviate collection '{collection_name}' already exists.")
+        return client_instance
             
-            collection_name = COLLECTION_NAME 
-            if not client_instance.collections.exists(collection_name):
-                print(f"Weaviate collection '{collection_name}' not found during startup. Will be created by ingest if needed.")
-            else:
-                print(f"Weaviate collection '{collection_name}' already exists.")
+    except Exception as e:
+        print(f"ERROR during Weaviate connection or initial check: {e}")
+        traceback.print_exc()
+        return None # Ensure it's None on failure
+
+async def startup_setup(app: FastAPI):
+    """Connects backends, builds the chain and warms models in the background; sets app.state.ready_event when done.
+
+    Blocking client calls run in worker threads so the event loop keeps answering /api/health meanwhile.
+    """
+    try:
+        app.state.weaviate_client = await asyncio.to_thread(connect_weaviate)
                 
-        except Exception as e:
-            print(f"ERROR during Weaviate connection or initial check: {e}")
-            traceback.print_exc()
-            app.state.weaviate_client = None # Ensure it's None on failure
-            
-    # Initialize MongoDB Client
-    print("Initializing MongoDB client...")
-    if mongo_handler.connect_to_mongo() is not None: 
-        print("MongoDB connection successful.")
-    else:
-        print("ERROR: Failed to connect to MongoDB during startup.")
-            
-    print("--- Startup Complete ---")
+        # Initialize MongoDB Client
+        print("Initializing MongoDB client...")
+        if await asyncio.to_thread(mongo_handler.connect_to_mongo) is not None: 
+            print("MongoDB connection successful.")
+            await asyncio.to_thread(mongo_handler.ensure_indexes)
+        else:
+            print("ERROR: Failed to connect to MongoDB during startup.")
+
+        # Build the RAG chain once; it is session-agnostic (session_id arrives via RunnableConfig)
+        if app.state.weaviate_client is not None:
+            try:
+                app.state.rag_chain = await asyncio.to_thread(
+                    create_chain, llm=create_llm(), retriever=None, client=app.state.weaviate_client
+                )
+                print("RAG chain built at startup.")
+            except Exception as e:
+                print(f"ERROR building RAG chain at startup (will build per request): {e}")
+                traceback.print_exc()
+
+        # Warm up models so the first chat request doesn't pay for connection setup / model load
+        if Config.WARMUP_MODELS:
+            print("Warming up models...")
+            await warm_up_models(include_embeddings=Config.USE_LOCAL_VECTOR_STORE)
+    except Exception as e:
+        print(f"ERROR during background startup: {e}")
+        traceback.print_exc()
+    finally:
+        # Open the gate even after failures; endpoints report missing clients themselves
+        app.state.ready_event.set()
+        print("--- Startup Complete ---")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # --- STARTUP --- 
+    print("--- Application Startup --- ")
+    
+    # Local directory clearing removed as S3 is primary for documents
+    # and processed_hashes.json is obsolete with Weaviate's direct hash checking.
+
+    # Heavy setup runs as a task so uvicorn starts accepting connections (and health checks) right away;
+    # StartupGateMiddleware holds other /api/ requests until ready_event is set.
+    app.state.weaviate_client = None 
+    app.state.rag_chain = None
+    app.state.ready_event = asyncio.Event()
+    app.state.startup_task = asyncio.create_task(startup_setup(app))
+    # Background /api/process jobs wait in a bounded queue; a fixed set of workers drains it
+    app.state.process_queue = asyncio.Queue(maxsize=Config.Ingest.QUEUE_SIZE)
+    app.state.process_workers = [
+        asyncio.create_task(process_job_worker(app.state.process_queue))
+        for _ in range(Config.Ingest.QUEUE_WORKERS)
+    ]
     yield
     
     # --- SHUTDOWN --- 
     print("--- Application Shutdown --- ")
+    for worker in app.state.process_workers:
+        worker.cancel()
+    await asyncio.gather(*app.state.process_workers, return_exceptions=True)
+    if not app.state.startup_task.done():
+        app.state.startup_task.cancel()
+        try:
+            await app.state.startup_task
+        except asyncio.CancelledError:
+            pass
     client_to_close = getattr(app.state, 'weaviate_client', None)
     if client_to_close and hasattr(client_to_close, 'close'):
         print("Closing Weaviate client connection...")
@@ -105,6 +203,33 @@ async def lifespan(app: FastAPI):
     mongo_handler.close_mongo_connection()
     print("--- Shutdown Complete --- ")
 
+class StartupGateMiddleware:
+    """ASGI middleware that holds /api/ requests (except /api/health) until startup_setup finishes.
+
+    Requests that wait longer than `timeout` seconds get a 503 with Retry-After. Plain ASGI rather than
+    @app.middleware("http") so streamed chat responses pass through untouched.
+    """
+
+    def __init__(self, app, timeout: float):
+        self.app = app
+        self.timeout = timeout
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith("/api/") and scope["path"] != "/api/health":
+            ready_event = getattr(scope["app"].state, "ready_event", None)
+            if ready_event is not None and not ready_event.is_set():
+                try:
+                    await asyncio.wait_for(ready_event.wait(), timeout=self.timeout)
+                except asyncio.TimeoutError:
+                    response = ORJSONResponse(
+                        status_code=503,
+                        content={"detail": "Service is starting up. Try again shortly."},
+                        headers={"Retry-After": "5"}
+                    )
+                    await response(scope, receive, send)
+                    return
+        await self.app(scope, receive, send)
+
 # --- Setup FastAPI App with Lifespan --- 
 app = FastAPI(
     title="docRAG API",
@@ -119,16 +244,21 @@ origins = [
     "http://localhost:5173", # Default Vite port 
     "http://127.0.0.1:5173", # Default Vite port 
     "http://localhost:5000",
-    "https://*.vercel.app", # Allow all Vercel deployments
-    "https://*.vercel.app/*"# The actual frontend origin
 ]
+# Wildcards don't work inside allow_origins (entries are compared literally), so Vercel
+# deployments are matched by one precompiled regex instead
+
+# Added before CORS so CORS stays outermost and 503s still carry CORS headers
+app.add_middleware(StartupGateMiddleware, timeout=Config.STARTUP_WAIT_SECONDS)
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins, # Use the updated list
+    allow_origin_regex=Config.CORS_ORIGIN_REGEX or None,
     allow_credentials=True,
     allow_methods=["*"], # Allows all methods
     allow_headers=["*"], # Allows all headers
+    expose_headers=["X-Next-Cursor"], # Pagination cursor for /api/history and /api/documents
 )
 
 
@@ -151,6 +281,21 @@ def create_chain_for_request(session_id: str, client: Optional[weaviate.Client]
         
     return chain
 
+# Guards the lazy fallback below so concurrent first requests build a single chain
+_rag_chain_lock = asyncio.Lock()
+
+async def get_or_create_rag_chain(app: FastAPI, session_id: str, client: Optional[weaviate.Client]) -> Runnable:
+    """Returns the shared chain from app.state, building and storing it once if startup didn't."""
+    rag_chain = getattr(app.state, 'rag_chain', None)
+    if rag_chain is not None:
+        return rag_chain
+    async with _rag_chain_lock:
+        rag_chain = getattr(app.state, 'rag_chain', None)
+        if rag_chain is None: # Startup build failed or was skipped
+            rag_chain = create_chain_for_request(session_id, client)
+            app.state.rag_chain = rag_chain
+        return rag_chain
+
 # --- Pydantic Models for Request/Response ---
 class ChatRequest(BaseModel):
     session_id: str
@@ -165,10 +310,30 @@ class ProcessResponse(BaseModel):
     processed_files: List[str] = [] # List of filenames successfully processed & ingested
     skipped_count: int = 0
     failed_files: List[str] = []
+    reused_count: int = 0 # Documents whose content was already ingested (same as skipped_count)
+    embedded_count: int = 0 # Documents newly embedded in this run
+    embedded_chunk_count: int = 0 # Chunks sent to the Weaviate vectorizer in this run
+
+class UploadResponse(BaseModel):
+    message: str
+    filenames_saved_to_s3: List[str] = []
+    skipped_unsupported_extension: int = 0
+    skipped_duplicate_content: int = 0
+
+class MessageResponse(BaseModel):
+    message: str
 
 class ProcessRequest(BaseModel):
     session_id: str # Add session_id field
     user_id: Optional[str] = None # Add optional user_id
+    run_in_background: bool = False # Return 202 with a job_id instead of waiting for ingestion
+
+class ProcessJobStatus(BaseModel):
+    job_id: str
+    session_id: str
+    status: Literal["queued", "running", "done", "failed"]
+    result: Optional[ProcessResponse] = None # Set when status is "done"
+    error: Optional[str] = None # Set when status is "failed"
 
 # --- NEW Models for Mongo Endpoints --- 
 class DocumentMetadata(BaseModel):
@@ -179,6 +344,7 @@ class DocumentMetadata(BaseModel):
     processed_at: Optional[datetime] = None 
 
 class ChatMessage(BaseModel):
+    id: Optional[str] = None # Message id; usable as the 'before' cursor
     role: str
     content: str
     timestamp: Optional[datetime] = None # Included if returned by handler
@@ -212,135 +378,235 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # --- API Endpoints ---
 
-# Define allowed extensions
-ALLOWED_EXTENSIONS = { ".pdf", ".docx", ".txt", ".md", ".xlsx", ".csv"}
+# Upper bound for ?limit= on paginated list endpoints
+PAGE_SIZE_MAX = 200
 
-@app.post("/api/upload", status_code=200)
-async def upload_documents(session_id: Annotated[str, Form()], files: Annotated[List[UploadFile], File()]) -> Dict:
+# Define allowed extensions
+ALLOWED_EXTENSIONS = frozenset(SUPPORTED_EXTENSIONS) # Set for single-file checks on upload
+# Built once, sorted so the message is stable (frozenset iteration order is not)
+_NO_ALLOWED_FILES_DETAIL = f"No files with allowed extensions ({', '.join(sorted(ALLOWED_EXTENSIONS))}) were provided."
+
+def hash_upload(fileobj) -> str:
+    """SHA256 of a spooled upload (rewinds it afterwards). hashlib uses the CPU's SHA extensions where available."""
+    fileobj.seek(0)
+    if hasattr(hashlib, "file_digest"): # Python 3.11+: the read/update loop runs in C with a reused buffer
+        hasher = hashlib.file_digest(fileobj, "sha256")
+    else:
+        hasher = hashlib.sha256()
+        while chunk := fileobj.read(1024 * 1024):
+            hasher.update(chunk)
+    fileobj.seek(0)
+    return hasher.hexdigest()
+
+@app.post("/api/upload", status_code=200, response_model=UploadResponse)
+async def upload_documents(session_id: Annotated[str, Form()], files: Annotated[List[UploadFile], File()], s3_client = Depends(get_s3_client_dependency)) -> UploadResponse:
     """Endpoint to upload one or more documents for a specific session.
     MODIFIED FOR AWS S3: Files will be uploaded to AWS S3.
     """
     print(f"UPLOAD: Received {len(files)} file(s) for upload in session: {session_id}")
-
-    # --- AWS S3 Client Initialization ---
-    try:
-        # Boto3 will use credentials from environment variables (AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_SESSION_TOKEN),
-        # an IAM role (if running on EC2/ECS), or the AWS CLI configuration (~/.aws/credentials).
-        s3_client = boto3.client('s3', region_name=Config.AWS.S3_REGION)
-    except Exception as e:
-        print(f"UPLOAD: ERROR initializing AWS S3 client: {e}")
-        raise HTTPException(status_code=500, detail="Could not connect to Object Storage (S3).")
-    # ----------------------------------
+    # Boto3 uses credentials from environment variables (AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_SESSION_TOKEN),
+    # an IAM role (if running on EC2/ECS), or the AWS CLI configuration (~/.aws/credentials).
 
     s3_object_prefix = f"tenants/{session_id}/"
     print(f"UPLOAD: Target S3 prefix: {s3_object_prefix}")
 
-    processed_filenames = []
-    allowed_count = 0
+    allowed_files = []
     skipped_count = 0
+    duplicate_count = 0
+    seen_hashes = set() # Content hashes uploaded in this request
 
     for file in files:
-        file_ext = Path(file.filename).suffix.lower()
+        file_ext = os.path.splitext(file.filename or "")[1].lower() # No PurePath allocation per file
         if file_ext not in ALLOWED_EXTENSIONS:
             print(f"UPLOAD: Skipping file with unsupported extension: {file.filename}")
             skipped_count += 1
             continue
+        allowed_files.append(file)
+    allowed_count = len(allowed_files)
 
-        allowed_count += 1
-        safe_filename = Path(file.filename).name
+    async def upload_one(file: UploadFile, content_hash: str) -> Optional[str]:
+        """Uploads one file to S3; returns its saved filename, or None if it failed."""
+        safe_filename = os.path.basename(file.filename)
         s3_object_key = f"{s3_object_prefix}{safe_filename}"
-
         try:
             # --- AWS S3 UPLOAD LOGIC ---
             print(f"UPLOAD: Attempting to upload to S3: bucket='{Config.AWS.S3_BUCKET_NAME}', key='{s3_object_key}'")
-            # FastAPI's UploadFile.file is a SpooledTemporaryFile, which is a file-like object.
-            # We need to ensure the file pointer is at the beginning if it has been read before,
-            # though for a new UploadFile, it should be.
-            await file.seek(0) 
-            s3_client.upload_fileobj(
+            # boto3 is blocking; run the upload in a worker thread so the event loop keeps serving other requests
+            await asyncio.to_thread(
+                s3_client.upload_fileobj,
                 file.file, # Pass the file-like object
                 Config.AWS.S3_BUCKET_NAME,
-                s3_object_key
+                s3_object_key,
+                # Stored with the object so ingest can reuse it instead of re-hashing the download
+                ExtraArgs={"Metadata": {"sha256": content_hash}},
+                Config=S3_TRANSFER_CONFIG
             )
             print(f"UPLOAD: Successfully uploaded to S3: {s3_object_key}")
             # --- END AWS S3 UPLOAD LOGIC ---
-            
-            processed_filenames.append(safe_filename)
-            
+            return safe_filename
         except ClientError as e:
             print(f"UPLOAD: ERROR (ClientError) processing file {file.filename} for S3 upload to {s3_object_key}: {e}")
             traceback.print_exc()
-            # Optionally, collect failed filenames here if you want to report them
         except Exception as e:
             print(f"UPLOAD: ERROR (General) processing file {file.filename} for S3 upload to {s3_object_key}: {e}")
             traceback.print_exc()
-        finally:
-            if file and hasattr(file, 'close') and callable(file.close):
-                try:
-                    await file.close()
-                except Exception as close_err:
-                    print(f"Warning: Error closing file handle for {file.filename}: {close_err}")
+        return None
+
+    try:
+        # FastAPI's UploadFile.file is a SpooledTemporaryFile; hash_upload rewinds it before and after reading.
+        # Hash all files concurrently, then dedupe in request order so the first copy of identical content wins.
+        content_hashes = await asyncio.gather(
+            *[asyncio.to_thread(hash_upload, file.file) for file in allowed_files],
+            return_exceptions=True
+        )
+        pending_uploads = []
+        for file, content_hash in zip(allowed_files, content_hashes):
+            if isinstance(content_hash, Exception):
+                print(f"UPLOAD: ERROR reading file {file.filename}: {content_hash}")
+                continue
+            if content_hash in seen_hashes:
+                print(f"UPLOAD: Skipping {file.filename}: same content as another file in this upload.")
+                duplicate_count += 1
+                continue
+            seen_hashes.add(content_hash)
+            pending_uploads.append(upload_one(file, content_hash))
+
+        # Upload all files concurrently; wall-clock time approaches the slowest file, not the sum
+        upload_results = await asyncio.gather(*pending_uploads)
+        processed_filenames = [filename for filename in upload_results if filename]
+    finally:
+        for file in files:
+            try:
+                await file.close()
+            except Exception as close_err:
+                print(f"Warning: Error closing file handle for {file.filename}: {close_err}")
 
     if allowed_count == 0:
-        raise HTTPException(status_code=400, detail=f"No files with allowed extensions ({', '.join(ALLOWED_EXTENSIONS)}) were provided.")
+        raise HTTPException(status_code=400, detail=_NO_ALLOWED_FILES_DETAIL)
 
     if not processed_filenames:
         raise HTTPException(status_code=500, detail="All valid files failed to upload to Object Storage (S3).")
 
-    return {
-        "message": f"{len(processed_filenames)} valid file(s) prepared for processing (uploaded to S3).", 
-        "filenames_saved_to_s3": processed_filenames,
-        "skipped_unsupported_extension": skipped_count
-    }
+    return UploadResponse(
+        message=f"{len(processed_filenames)} valid file(s) prepared for processing (uploaded to S3).", 
+        filenames_saved_to_s3=processed_filenames,
+        skipped_unsupported_extension=skipped_count,
+        skipped_duplicate_content=duplicate_count
+    )
 
-@app.post("/api/process", response_model=ProcessResponse)
-async def process_documents(request: ProcessRequest, client: weaviate.Client = Depends(get_weaviate_client_dependency)):
+def run_processing(session_id: str, user_id: Optional[str], client: weaviate.Client, s3_client) -> ProcessResponse:
+    """Ingests a session's S3 files and saves metadata for the processed ones (blocking)."""
+    # Call the ingest function
+    ingest_result = ingest.process_files_for_session(session_id, client, s3_client=s3_client)
+    print(f"DEBUG /api/process: ingest_result = {ingest_result}")
+
+    # --- Save metadata to MongoDB for successfully processed files --- 
+    processed_files = ingest_result.get("processed_files", []) # Use "processed_files" key
+    if processed_files:
+        print(f"Saving metadata to MongoDB for {len(processed_files)} processed files in session {session_id}...")
+        saved_count = 0
+        for filename in processed_files:
+            # Pass user_id to the handler
+            metadata_saved = mongo_handler.save_document_metadata(
+                session_id=session_id, 
+                filename=filename, 
+                user_id=user_id, # Pass it here
+                processed_at=datetime.utcnow()
+            )
+            if metadata_saved:
+                saved_count += 1
+            else:
+                print(f"Warning: Failed to save metadata for {filename} in session {session_id}")
+        print(f"Successfully saved metadata for {saved_count}/{len(processed_files)} files.")
+    else:
+         print(f"No files were successfully processed in session {session_id}, skipping metadata save.")
+    # ----------------------------------------------------------------
+    
+    # Return ProcessResponse based on the dictionary from ingest
+    return ProcessResponse(
+        message=ingest_result.get("message", "Processing status unknown."),
+        processed_files=processed_files,
+        skipped_count=ingest_result.get("skipped_count", 0),
+        failed_files=ingest_result.get("failed_files", []),
+        reused_count=ingest_result.get("reused_count", 0),
+        embedded_count=ingest_result.get("embedded_count", 0),
+        embedded_chunk_count=ingest_result.get("embedded_chunk_count", 0)
+    )
+
+# Background processing jobs of this worker, oldest first. Status is only visible on the worker that
+# accepted the job, so run a single worker (or sticky routing) when clients poll for status.
+PROCESS_JOBS_MAX = 1000
+_process_jobs: "OrderedDict[str, ProcessJobStatus]" = OrderedDict()
+
+async def run_process_job(job_id: str, session_id: str, user_id: Optional[str], client: weaviate.Client, s3_client):
+    """Runs one queued job in a worker thread and records its outcome in _process_jobs."""
+    _process_jobs[job_id] = ProcessJobStatus(job_id=job_id, session_id=session_id, status="running")
+    try:
+        result = await asyncio.to_thread(run_processing, session_id, user_id, client, s3_client)
+        _process_jobs[job_id] = ProcessJobStatus(job_id=job_id, session_id=session_id, status="done", result=result)
+    except Exception as e:
+        print(f"!!!!!!!! UNEXPECTED ERROR in background processing job {job_id} for session {session_id}: {e} !!!!!!!!")
+        traceback.print_exc()
+        _process_jobs[job_id] = ProcessJobStatus(job_id=job_id, session_id=session_id, status="failed", error=str(e))
+
+async def process_job_worker(queue: asyncio.Queue):
+    """Drains the processing queue one job at a time until cancelled at shutdown."""
+    while True:
+        job_args = await queue.get()
+        try:
+            await run_process_job(*job_args)
+        finally:
+            queue.task_done()
+
+@app.post("/api/process", response_model=ProcessResponse, responses={202: {"model": ProcessJobStatus}})
+async def process_documents(
+    request: ProcessRequest,
+    http_request: Request,
+    client: weaviate.Client = Depends(get_weaviate_client_dependency),
+    s3_client = Depends(get_s3_client_dependency)
+):
     session_id = request.session_id
     user_id = request.user_id # Get user_id from request
     print(f"DEBUG /api/process: Session ID = {session_id}, User ID = {user_id}")
 
-    try:
-        # Call the ingest function
-        ingest_result = ingest.process_files_for_session(session_id, client)
-        print(f"DEBUG /api/process: ingest_result = {ingest_result}")
-
-        # --- Save metadata to MongoDB for successfully processed files --- 
-        processed_files = ingest_result.get("processed_files", []) # Use "processed_files" key
-        if processed_files:
-            print(f"Saving metadata to MongoDB for {len(processed_files)} processed files in session {session_id}...")
-            saved_count = 0
-            for filename in processed_files:
-                # Pass user_id to the handler
-                metadata_saved = mongo_handler.save_document_metadata(
-                    session_id=session_id, 
-                    filename=filename, 
-                    user_id=user_id, # Pass it here
-                    processed_at=datetime.utcnow()
-                )
-                if metadata_saved:
-                    saved_count += 1
-                else:
-                    print(f"Warning: Failed to save metadata for {filename} in session {session_id}")
-            print(f"Successfully saved metadata for {saved_count}/{len(processed_files)} files.")
-        else:
-             print(f"No files were successfully processed in session {session_id}, skipping metadata save.")
-        # ----------------------------------------------------------------
-        
-        # Return ProcessResponse based on the dictionary from ingest
-        return ProcessResponse(
-            message=ingest_result.get("message", "Processing status unknown."),
-            processed_files=processed_files,
-            skipped_count=ingest_result.get("skipped_count", 0),
-            failed_files=ingest_result.get("failed_files", [])
-        )
+    if request.run_in_background:
+        # Answer right away; the client polls GET /api/process/status/{job_id}
+        job_id = uuid4().hex
+        job = ProcessJobStatus(job_id=job_id, session_id=session_id, status="queued")
+        try:
+            http_request.app.state.process_queue.put_nowait((job_id, session_id, user_id, client, s3_client))
+        except asyncio.QueueFull:
+            raise HTTPException(status_code=503, detail="Too many documents are being processed right now. Please retry shortly.")
+        _process_jobs[job_id] = job
+        while len(_process_jobs) > PROCESS_JOBS_MAX:
+            _process_jobs.popitem(last=False)
+        return ORJSONResponse(status_code=202, content=job.model_dump(mode="json", exclude_none=True))
 
+    try:
+        # Parsing, embedding and Weaviate writes block; run them off the event loop so chat streams keep flowing
+        return await asyncio.to_thread(run_processing, session_id, user_id, client, s3_client)
     except Exception as e:
         print(f"!!!!!!!! UNEXPECTED ERROR in /api/process endpoint for session {session_id}: {e} !!!!!!!!")
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Unexpected error during document processing: {e}")
 
+@app.get("/api/process/status/{job_id}", response_model=ProcessJobStatus, response_model_exclude_none=True)
+async def get_process_status(job_id: str):
+    job = _process_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Processing job {job_id} not found.")
+    return job
+
+def log_history_save_result(future: "asyncio.Future", session_id: str) -> None:
+    """Done-callback for the fire-and-forget history write; nothing awaits it, so surface failures here."""
+    if future.cancelled():
+        return
+    exc = future.exception()
+    if exc is not None:
+        logger.error("Failed to save chat history for session %s", session_id, exc_info=exc)
+
 @app.post("/api/chat")
-async def chat_endpoint(chat_req: ChatRequest, background_tasks: BackgroundTasks, client: weaviate.Client = Depends(get_weaviate_client_dependency)):
+async def chat_endpoint(chat_req: ChatRequest, request: Request, client: weaviate.Client = Depends(get_weaviate_client_dependency)):
     session_id = chat_req.session_id
     query = chat_req.query
 
@@ -348,26 +614,26 @@ async def chat_endpoint(chat_req: ChatRequest, background_tasks: BackgroundTasks
         raise HTTPException(status_code=400, detail="session_id and query are required")
 
     try:
-        rag_chain = create_chain_for_request(session_id, client)
+        rag_chain = await get_or_create_rag_chain(request.app, session_id, client)
+        # Only what the chain reads (GetSessionIdFromConfig); the client and query are already bound elsewhere.
+        # No callback handlers: each one is dispatched on every start/end/token event of every step.
         config = RunnableConfig(
-            callbacks=[LoggingCallbackHandler("Chat Endpoint Chain")],
-            configurable={
-                "session_id": session_id,
-                "client": client,
-                "user_query": query # Pass user query here
-            },
+            configurable={"session_id": session_id},
             recursion_limit=25
         )
 
-        async def stream_response() -> AsyncGenerator[str, Any]:
+        async def stream_response() -> AsyncGenerator[bytes, Any]:
             event_counter = 0
             final_sources = []
-            full_answer = "" # Accumulate the full answer
+            answer_parts: List[str] = [] # Token deltas, joined once when the stream ends
             try:
                 async for event in rag_chain.astream_events(
                     {"question": query},
                     config=config,
-                    version="v1",
+                    version="v2",
+                    # Only the events handled below: retrieval, prompt and parser steps are never dispatched
+                    include_names=["FormatAndGenerate"],
+                    include_types=["chat_model"],
                 ):
                     event_counter += 1
                     # log_event(event, event_counter) # Keep quiet unless debugging
@@ -382,11 +648,11 @@ async def chat_endpoint(chat_req: ChatRequest, background_tasks: BackgroundTasks
                              # Get the final generated answer here as well
                              answer_part = output_data.get("answer", "")
                              if isinstance(answer_part, str): # If it's already parsed to string
-                                 full_answer = answer_part 
-                                 print(f"--- Captured final answer (str) on chain end ---")
+                                 answer_parts = [answer_part]
+                                 logger.debug("Captured final answer (str) on chain end")
                              elif hasattr(answer_part, 'content'): # If it's an AIMessageChunk/AIMessage
-                                 full_answer = answer_part.content
-                                 print(f"--- Captured final answer (AIMessage) on chain end ---")
+                                 answer_parts = [answer_part.content]
+                                 logger.debug("Captured final answer (AIMessage) on chain end")
                              else:
                                  print(f"Warning: Unexpected answer type on FormatAndGenerate end: {type(answer_part)}")
                                 # Attempt to capture from llm stream if direct capture fails
@@ -398,29 +664,23 @@ async def chat_endpoint(chat_req: ChatRequest, background_tasks: BackgroundTasks
                         chunk = event["data"]["chunk"]
                         content = chunk.content
                         if content:
-                            full_answer += content # Accumulate here
-                            token_json = json.dumps({"type": "token", "content": content})
-                            yield f"data: {token_json}\n\n"
-                            
-                    # Yield errors immediately
-                    elif event_type == "on_chain_error" or event_type == "on_tool_error" or event_type == "on_retriever_error" or event_type == "on_llm_error":
-                        error_message = str(event["data"].get("error", "Unknown stream error"))
-                        print(f"ERROR during stream event: {error_message}")
-                        error_json = json.dumps({"type": "error", "message": error_message})
-                        yield f"data: {error_json}\n\n"
-                        break
+                            answer_parts.append(content) # Accumulate here
+                            yield sse_token(content)
 
-            except Exception as e:
-                print(f"ERROR during chain execution or streaming: {e}")
-                traceback.print_exc()
-                error_json = json.dumps({"type": "error", "message": f"Server error during streaming: {e}"})
-                yield f"data: {error_json}\n\n"
+            except Exception as e: # Chain errors are raised here; astream_events emits no *_error events
+                logger.exception("Error during chain execution or streaming for session %s", session_id)
+                yield sse_event({"type": "error", "message": f"Server error during streaming: {e}"})
             finally:
-                print("DEBUG stream_response: astream_events loop finished.")
+                logger.debug("stream_response: astream_events loop finished after %d events", event_counter)
+                full_answer = "".join(answer_parts)
                 # --- Save message pair after streaming finishes --- 
                 if full_answer: # Only save if an answer was generated
-                    print(f"DEBUG stream_response: Adding save_message_pair to background tasks for session {session_id}.")
-                    background_tasks.add_task(save_message_pair, session_id, query, full_answer)
+                    # Start the Mongo write now in a worker thread, concurrently with the final frames,
+                    # rather than after the response closes: the next turn's history read then sees it,
+                    # and it still runs if the client disconnects before 'end'.
+                    logger.debug("stream_response: starting save_message_pair in a worker thread for session %s", session_id)
+                    save_future = asyncio.get_running_loop().run_in_executor(None, save_message_pair, session_id, query, full_answer)
+                    save_future.add_done_callback(lambda f: log_history_save_result(f, session_id))
                 else:
                     print(f"WARNING stream_response: No full answer generated for session {session_id}, skipping history save.")
                 # ----------------------------------------------------
@@ -428,27 +688,26 @@ async def chat_endpoint(chat_req: ChatRequest, background_tasks: BackgroundTasks
                 # Yield final sources
                 if final_sources:
                     try:
-                         sources_json = json.dumps({"type": "sources", "sources": [format_source(s) for s in final_sources]})
-                         print(f"--- Backend Stream: Yielding final sources ({len(final_sources)}) --- ")
-                         yield f"data: {sources_json}\n\n"
+                         sources_frame = sse_event({"type": "sources", "sources": [format_source(s) for s in final_sources if isinstance(s, Document)]})
+                         logger.debug("stream_response: yielding %d final sources", len(final_sources))
+                         yield sources_frame
                     except Exception as format_err:
                          print(f"ERROR formatting final sources: {format_err}")
                          # Optionally yield an error event here if source formatting fails
 
                 # Send the final 'end' event
-                end_event = json.dumps({"type": "end", "content": "Stream finished"})
-                print("--- Backend Stream: Sent 'end' event ---")
-                yield f"data: {end_event}\n\n"
+                yield _SSE_END_FRAME
 
         # Use standard StreamingResponse
         headers = {
             'Cache-Control': 'no-cache, no-store, must-revalidate',
             'Pragma': 'no-cache',
             'Expires': '0',
+            'X-Accel-Buffering': 'no', # Stop nginx-style reverse proxies from buffering tokens
             # Keep Content-Type as text/event-stream for the frontend
             'Content-Type': 'text/event-stream' 
         }
-        return StreamingResponse(stream_response(), media_type="text/event-stream", headers=headers)
+        return StreamingResponse(with_sse_keepalive(stream_response()), media_type="text/event-stream", headers=headers)
 
     except HTTPException as he:
         print(f"HTTP Exception in chat endpoint: {he.detail}")
@@ -458,36 +717,69 @@ async def chat_endpoint(chat_req: ChatRequest, background_tasks: BackgroundTasks
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Internal server error in chat endpoint: {e}")
 
+# Helper to frame one Server-Sent Event; every /api/chat frame goes through here
+def sse_event(payload: Dict[str, Any]) -> bytes:
+    """Serializes a payload as a single unnamed SSE 'data:' frame (the format the frontend parses)."""
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+# Token frames are the hot path: splice the JSON-encoded string into a fixed template
+# (byte-identical to sse_event({"type": "token", "content": ...})) instead of building a dict per token.
+_SSE_TOKEN_PREFIX = b'data: {"type":"token","content":'
+_SSE_TOKEN_SUFFIX = b'}\n\n'
+
+def sse_token(content: str) -> bytes:
+    return _SSE_TOKEN_PREFIX + orjson.dumps(content) + _SSE_TOKEN_SUFFIX
+
+_SSE_END_FRAME = sse_event({"type": "end", "content": "Stream finished"})
+
+# SSE comment frames: ignored by EventSource parsers, but they make proxies commit the response
+# right away and stop idle timeouts while the LLM is still retrieving/thinking.
+_SSE_OPEN_FRAME = b": open\n\n"
+_SSE_PING_FRAME = b": ping\n\n"
+SSE_KEEPALIVE_SECONDS = 15
+
+async def with_sse_keepalive(stream: AsyncGenerator[bytes, Any], interval: float = SSE_KEEPALIVE_SECONDS) -> AsyncGenerator[bytes, Any]:
+    """Yields an opening comment immediately, then the stream's frames, plus a ping whenever it is idle for `interval` seconds."""
+    yield _SSE_OPEN_FRAME
+    next_frame = asyncio.ensure_future(stream.__anext__())
+    try:
+        while True:
+            done, _ = await asyncio.wait({next_frame}, timeout=interval)
+            if not done:
+                yield _SSE_PING_FRAME
+                continue
+            try:
+                frame = next_frame.result()
+            except StopAsyncIteration:
+                break
+            yield frame
+            next_frame = asyncio.ensure_future(stream.__anext__())
+    finally:
+        if not next_frame.done(): # Client went away mid-stream
+            next_frame.cancel()
+            try:
+                await next_frame
+            except (asyncio.CancelledError, StopAsyncIteration):
+                pass
+        await stream.aclose()
+
+SOURCE_SNIPPET_CHARS = 100
+
 # Helper to format source documents
 def format_source(doc: Document) -> Dict:
     # Basic formatting, adjust as needed
     metadata = doc.metadata or {}
+    content = doc.page_content or ""
+    # Short chunks are sent as-is; only long ones pay for the slice + "..." concat
+    snippet = content if len(content) <= SOURCE_SNIPPET_CHARS else content[:SOURCE_SNIPPET_CHARS] + "..."
     return {
-        "content_snippet": doc.page_content[:100] + ("..." if len(doc.page_content) > 100 else ""), # Example snippet
+        "content_snippet": snippet,
         "metadata": {
             "source": metadata.get('source', 'Unknown'),
             "page": metadata.get('page'),
         }
     }
 
-# --- Simple Logging Callback Handler --- 
-class LoggingCallbackHandler(BaseCallbackHandler):
-    def __init__(self, name: str = "Unnamed Chain"):
-        self.name = name
-        self.event_count = 0
-        
-    def _log(self, event_name: str, run_id: UUID, **kwargs: Any) -> None:
-        self.event_count += 1
-        pass
-
-    def on_chain_start(self, serialized: Dict[str, Any], inputs: Dict[str, Any], *, run_id: UUID, parent_run_id: UUID | None = None, tags: List[str] | None = None, metadata: Dict[str, Any] | None = None, **kwargs: Any) -> Any:
-        self._log("on_chain_start", run_id, inputs=inputs, tags=tags, metadata=metadata)
-
-    def on_chain_end(self, outputs: Dict[str, Any], *, run_id: UUID, parent_run_id: UUID | None = None, **kwargs: Any) -> Any:
-        self._log("on_chain_end", run_id, outputs=outputs)
-
-    # Add other on_... methods if you need more detailed logging (on_llm_start, etc.)
-
 def log_event(event: Dict[str, Any], counter: int):
     """Helper function to log specific details from astream_events."""
     event_kind = event.get("event")
@@ -503,35 +795,54 @@ def log_event(event: Dict[str, Any], counter: int):
              pass # Reduced verbosity
     pass # Keep overall logging quiet unless needed
 
-@app.get("/api/documents", response_model=List[DocumentMetadata])
-async def get_documents_for_user(user_id: str): # How to get user_id? Auth needed.
-    """Retrieves list of documents associated with a user."""
+def validate_cursor(before: Optional[str]) -> None:
+    """Rejects pagination cursors that aren't Mongo ObjectIds."""
+    if before is not None and not ObjectId.is_valid(before):
+        raise HTTPException(status_code=400, detail="Invalid 'before' cursor")
+
+@app.get("/api/documents", response_model=List[DocumentMetadata], response_model_exclude_none=True, response_class=ORJSONResponse)
+async def get_documents_for_user(
+    user_id: str, # How to get user_id? Auth needed.
+    response: Response,
+    limit: int = Query(50, ge=1, le=PAGE_SIZE_MAX),
+    before: Optional[str] = None
+):
+    """Retrieves a page of documents associated with a user (newest first).
+    The cursor for the next page is returned in the X-Next-Cursor header."""
     # This endpoint NEEDS proper authentication to get the correct user_id
     # For now, it takes user_id as a query parameter for testing.
     print(f"Endpoint /api/documents called for user_id: {user_id}")
-    docs = mongo_handler.get_user_documents(user_id)
-    if not docs:
-        # Return empty list, or 404 if preferred
-        # raise HTTPException(status_code=404, detail="No documents found for this user.")
-        pass 
+    validate_cursor(before)
+    docs, next_cursor = mongo_handler.get_user_documents(user_id, limit=limit, before=before)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return docs
 
-@app.get("/api/history/{session_id}", response_model=List[ChatMessage])
-async def get_session_chat_history(session_id: str):
-    """Retrieves the chat history for a specific session."""
+@app.get("/api/history/{session_id}", response_model=List[ChatMessage], response_model_exclude_none=True, response_class=ORJSONResponse)
+async def get_session_chat_history(
+    session_id: str,
+    response: Response,
+    limit: int = Query(50, ge=1, le=PAGE_SIZE_MAX),
+    before: Optional[str] = None
+):
+    """Retrieves a page of chat history for a session: the newest `limit` messages
+    (or those older than `before`), oldest first. Next-page cursor is in X-Next-Cursor."""
     print(f"Endpoint /api/history/{session_id} called")
-    history = mongo_handler.get_chat_history(session_id)
+    validate_cursor(before)
+    history, next_cursor = mongo_handler.get_chat_history_page(session_id, limit=limit, before=before)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     # The response model will validate the structure
     return history
 
-@app.post("/api/insights", status_code=201)
+@app.post("/api/insights", status_code=201, response_model=MessageResponse)
 async def save_user_insight(request: InsightRequest):
     """Saves a user-provided insight for a specific session."""
     print(f"Endpoint /api/insights called for session: {request.session_id}")
     success = mongo_handler.save_insight(request.session_id, request.insight)
     if not success:
         raise HTTPException(status_code=500, detail="Failed to save insight.")
-    return {"message": "Insight saved successfully."}
+    return MessageResponse(message="Insight saved successfully.")
 
 @app.get("/api/insights/{session_id}", response_model=List[InsightData])
 async def get_session_insights(session_id: str):
@@ -540,7 +851,7 @@ async def get_session_insights(session_id: str):
     insights = mongo_handler.get_insights(session_id)
     return insights
 
-@app.delete("/api/insights/{insight_id}", status_code=200)
+@app.delete("/api/insights/{insight_id}", status_code=200, response_model=MessageResponse)
 async def delete_user_insight(insight_id: str):
     """Deletes a specific insight by its ID."""
     print(f"Endpoint DELETE /api/insights/{insight_id} called")
@@ -548,21 +859,17 @@ async def delete_user_insight(insight_id: str):
     if not success:
         # Consider returning 404 if not found vs 500 for other errors
         raise HTTPException(status_code=404, detail=f"Insight with id {insight_id} not found or failed to delete.")
-    return {"message": "Insight deleted successfully."}
+    return MessageResponse(message="Insight deleted successfully.")
 
 # --- NEW Endpoint to Serve Uploaded Files --- 
+PRESIGNED_URL_EXPIRES_SECONDS = 300 # URL expires in 5 minutes
+# Cached a minute less than the URL lives, so a cached redirect never points at an expired URL
+_PRESIGNED_REDIRECT_CACHE_CONTROL = f"private, max-age={PRESIGNED_URL_EXPIRES_SECONDS - 60}"
+
 @app.get("/api/files/{session_id}/{filename}") # Removed response_class=StreamingResponse, will be RedirectResponse
-async def get_document_file(session_id: str, filename: str):
-    if ".." in filename or "/" in filename or "\\\\": # Python auto-escapes backslashes in f-strings/strings
+async def get_document_file(session_id: str, filename: str, s3_client = Depends(get_s3_client_dependency)):
+    if ".." in filename or "/" in filename or "\\" in filename:
         raise HTTPException(status_code=400, detail="Invalid filename")
-        
-    # --- AWS S3 Client Initialization ---
-    try:
-        s3_client = boto3.client('s3', region_name=Config.AWS.S3_REGION, config=boto3.session.Config(signature_version='s3v4'))
-    except Exception as e:
-        print(f"GET_FILE: ERROR initializing AWS S3 client: {e}")
-        raise HTTPException(status_code=500, detail="Could not connect to Object Storage (S3).")
-    # -----------------------------------------------------
 
     s3_object_key = f"tenants/{session_id}/{filename}"
     
@@ -573,10 +880,11 @@ async def get_document_file(session_id: str, filename: str):
         presigned_url = s3_client.generate_presigned_url('get_object',
                                                          Params={'Bucket': Config.AWS.S3_BUCKET_NAME,
                                                                  'Key': s3_object_key},
-                                                         ExpiresIn=300) # URL expires in 5 minutes (300 seconds)
+                                                         ExpiresIn=PRESIGNED_URL_EXPIRES_SECONDS)
         
         print(f"GET_FILE: Successfully generated pre-signed URL for {s3_object_key}")
-        return RedirectResponse(url=presigned_url)
+        # S3 serves the bytes (ranges, Content-Length) directly; let the browser reuse the redirect while the URL is still valid
+        return RedirectResponse(url=presigned_url, headers={"Cache-Control": _PRESIGNED_REDIRECT_CACHE_CONTROL})
     
     except ClientError as e:
         error_code = e.response.get("Error", {}).get("Code")
@@ -597,7 +905,7 @@ async def get_document_file(session_id: str, filename: str):
     # --- END AWS S3 GET OBJECT LOGIC ---
 
 # --- NEW: Delete Document Endpoint --- 
-@app.delete("/api/documents/{session_id}", status_code=200)
+@app.delete("/api/documents/{session_id}", status_code=200, response_model=MessageResponse)
 async def delete_document_endpoint(session_id: str, client: weaviate.Client = Depends(get_weaviate_client_dependency)):
     print(f"--- Received request to delete session: {session_id} ---")
     # TODO: Add user authentication check - ensure user owns this session_id
@@ -621,6 +929,7 @@ async def delete_document_endpoint(session_id: str, client: weaviate.Client = De
                     if collection.tenants.exists(session_id):
                         print(f"  [Delete] Deleting Weaviate tenant: {session_id} from collection {collection_name}...")
                         collection.tenants.remove([session_id])
+                        ingest.forget_tenant(session_id)
                         print(f"  [Delete] Weaviate tenant {session_id} deleted.")
                     else:
                          print(f"  [Delete] Weaviate tenant {session_id} not found in collection {collection_name}. Skipping.")
@@ -654,7 +963,7 @@ async def delete_document_endpoint(session_id: str, client: weaviate.Client = De
         raise HTTPException(status_code=500, detail=f"Deletion partially failed for session {session_id}. Errors: {'; '.join(errors)}")
     else:
         print(f"--- Successfully deleted DB data for session: {session_id} (File system deletion skipped) ---")
-        return {"message": f"Successfully deleted document database entries for session {session_id}. File system deletion skipped."}
+        return MessageResponse(message=f"Successfully deleted document database entries for session {session_id}. File system deletion skipped.")
 
 # --- NEW Authentication Endpoints ---
 
@@ -705,6 +1014,12 @@ async def register_user(user_data: UserCreate):
 # --- END NEW Authentication Endpoints ---
 
 # --- Root Endpoint --- 
+@app.get("/api/health")
+async def health(request: Request):
+    """Liveness plus readiness; always 200 so container health checks pass while startup runs in the background."""
+    ready_event = getattr(request.app.state, "ready_event", None)
+    return {"status": "ok", "ready": ready_event is not None and ready_event.is_set()}
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the DocRAG API"}
@@ -0,0 +1,77 @@
+# backend/cache/session_cache.py
+# Small in-process TTL cache for per-session Mongo reads (e.g. chat history).
+# Entries are grouped by session_id so a write can drop everything cached for that session.
+# Each uvicorn worker has its own cache; the TTL bounds staleness across workers.
+# At most max_sessions sessions are kept; the least recently used one is dropped first.
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class SessionCache:
+    """Thread-safe, LRU-bounded TTL cache keyed by (session_id, variant) with per-session invalidation."""
+
+    def __init__(self, ttl_seconds: float = 30.0, max_sessions: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._entries: "OrderedDict[str, Dict[Hashable, Tuple[Any, float]]]" = OrderedDict()
+        # Bumped on invalidate so in-flight loads don't store stale data. Values come from one
+        # monotonic counter, so a generation never repeats; sessions without an entry here share
+        # _untracked_generation, which moves whenever a tracked generation is evicted.
+        self._generations: "OrderedDict[str, int]" = OrderedDict()
+        self._counter = 0
+        self._untracked_generation = 0
+        self._lock = threading.Lock()
+
+    def _generation(self, session_id: str) -> int:
+        return self._generations.get(session_id, self._untracked_generation)
+
+    def _put(self, session_id: str, variant: Hashable, value: Any) -> None:
+        self._entries.setdefault(session_id, {})[variant] = (value, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self.max_sessions:
+            self._entries.popitem(last=False)
+
+    def get(self, session_id: str, loader: Callable[[], Any], variant: Hashable = None) -> Any:
+        """Returns the cached value, or calls loader() and caches its result.
+
+        Cached values are shared between callers and must be treated as read-only.
+        A loader result of None (load failed) is returned but not cached.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(session_id, {}).get(variant)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(session_id)
+                return entry[0]
+            generation = self._generation(session_id)
+        # Load outside the lock so a slow query doesn't block other sessions
+        value = loader()
+        if value is None:
+            return None
+        with self._lock:
+            if self._generation(session_id) == generation:
+                self._put(session_id, variant, value)
+        return value
+
+    def invalidate(self, session_id: str) -> None:
+        """Drops every cached value for a session (call after writing to it)."""
+        with self._lock:
+            self._entries.pop(session_id, None)
+            self._counter += 1
+            self._generations[session_id] = self._counter
+            self._generations.move_to_end(session_id)
+            if len(self._generations) > self.max_sessions:
+                self._generations.popitem(last=False)
+                # The evicted session now reads the shared value; move it so that session's
+                # in-flight loads (and any other untracked ones) can't match and store stale data
+                self._counter += 1
+                self._untracked_generation = self._counter
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+            self._counter += 1
+            self._untracked_generation = self._counter
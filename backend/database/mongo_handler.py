@@ -1,13 +1,14 @@
 import os
 import logging
-from typing import List, Dict, Optional, Any
-from pymongo import MongoClient
+from typing import List, Dict, Optional, Any, Tuple
+from pymongo import ASCENDING, DESCENDING, MongoClient
 from pymongo.database import Database
 from pymongo.collection import Collection
 from pymongo.errors import ConnectionFailure, OperationFailure
 from dotenv import load_dotenv
 from datetime import datetime
 from bson import ObjectId
+from ..cache.session_cache import SessionCache
 
 # Load environment variables from .env file
 load_dotenv()
@@ -22,6 +23,21 @@ HISTORY_COLLECTION = "chat_history"
 INSIGHTS_COLLECTION = "insights"
 USERS_COLLECTION = "users"
 
+# Projections: fetch only the fields the API response models use, not whole documents
+DOCUMENT_LIST_PROJECTION = {"_id": 1, "session_id": 1, "filename": 1, "user_id": 1, "processed_at": 1}
+CHAT_MESSAGE_PROJECTION = {"_id": 1, "role": 1, "content": 1, "timestamp": 1}
+INSIGHT_PROJECTION = {"_id": 1, "insight": 1, "timestamp": 1}
+
+# Chat history reads for /api/history are cached briefly and invalidated on writes. The chain's
+# per-turn history read bypasses the cache: it runs right after a save and must see that turn.
+# The max-sessions bound keeps memory flat however many sessions a long-running worker sees.
+CHAT_HISTORY_CACHE_TTL = float(os.getenv("CHAT_HISTORY_CACHE_TTL", "30"))
+CHAT_HISTORY_CACHE_MAX_SESSIONS = int(os.getenv("CHAT_HISTORY_CACHE_MAX_SESSIONS", "1024"))
+chat_history_cache = SessionCache(ttl_seconds=CHAT_HISTORY_CACHE_TTL, max_sessions=CHAT_HISTORY_CACHE_MAX_SESSIONS)
+# Same for the first page of a user's document list, keyed by user_id instead of session_id
+DOCUMENT_LIST_CACHE_TTL = float(os.getenv("DOCUMENT_LIST_CACHE_TTL", "30"))
+document_list_cache = SessionCache(ttl_seconds=DOCUMENT_LIST_CACHE_TTL)
+
 # Logger setup
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -74,6 +90,41 @@ def close_mongo_connection():
         _client = None
         _db = None
 
+# Index per list/lookup query shape, so each is an index scan instead of a collection scan
+INDEXES = {
+    DOCUMENTS_COLLECTION: [
+        [("user_id", ASCENDING), ("_id", DESCENDING)], # get_user_documents (newest first, _id cursor)
+        [("session_id", ASCENDING)], # save_document_metadata upsert, delete_all_session_data
+    ],
+    HISTORY_COLLECTION: [
+        [("session_id", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)], # get_chat_history
+        [("session_id", ASCENDING), ("_id", DESCENDING)], # get_chat_history_page
+    ],
+    INSIGHTS_COLLECTION: [
+        [("session_id", ASCENDING), ("timestamp", ASCENDING)], # get_insights
+    ],
+    USERS_COLLECTION: [
+        [("username", ASCENDING)],
+        [("email", ASCENDING)],
+    ],
+}
+
+def ensure_indexes() -> bool:
+    """Creates the indexes in INDEXES if missing. create_index is a no-op for existing indexes, so this is safe at every startup."""
+    db = get_db()
+    if db is None:
+        return False
+    ok = True
+    for collection_name, index_keys in INDEXES.items():
+        for keys in index_keys:
+            try:
+                db[collection_name].create_index(keys)
+            except OperationFailure as e:
+                logger.error(f"Could not create index {keys} on {collection_name}: {e}")
+                ok = False
+    logger.info("MongoDB indexes ensured." if ok else "MongoDB indexes ensured with errors.")
+    return ok
+
 # --- CRUD Operations ---
 
 def save_document_metadata(session_id: str, filename: str, user_id: Optional[str] = None, **kwargs) -> bool:
@@ -88,6 +139,7 @@ def save_document_metadata(session_id: str, filename: str, user_id: Optional[str
             {"$set": {"session_id": session_id, "filename": filename, "user_id": user_id, **kwargs}},
             upsert=True
         )
+        document_list_cache.invalidate(user_id)
         logger.info(f"Document metadata saved/updated for session_id: {session_id}. Matched: {result.matched_count}, Modified: {result.modified_count}, UpsertedId: {result.upserted_id}")
         return True
     except OperationFailure as e:
@@ -98,19 +150,36 @@ def save_document_metadata(session_id: str, filename: str, user_id: Optional[str
         return False
 
 
-def get_user_documents(user_id: str) -> List[Dict[str, Any]]:
-    """Retrieves all document metadata associated with a user_id."""
+def get_user_documents(user_id: str, limit: int = 50, before: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Retrieves document metadata for a user_id, newest first, one page at a time.
+
+    Returns (documents, next_cursor); pass next_cursor as `before` to get the next page.
+    The first page is cached briefly; treat it as read-only.
+    """
+    if before is None:
+        page = document_list_cache.get(user_id, lambda: _load_user_documents(user_id, limit, None), variant=limit)
+    else:
+        page = _load_user_documents(user_id, limit, before)
+    return page if page is not None else ([], None)
+
+def _load_user_documents(user_id: str, limit: int, before: Optional[str]) -> Optional[Tuple[List[Dict[str, Any]], Optional[str]]]:
     db = get_db()
     if db is None:
-        return []
+        return None
     try:
         documents_collection: Collection = db[DOCUMENTS_COLLECTION]
-        user_docs = list(documents_collection.find({"user_id": user_id}, {"_id": 0})) # Exclude MongoDB default _id
+        query: Dict[str, Any] = {"user_id": user_id}
+        if before is not None:
+            query["_id"] = {"$lt": ObjectId(before)}
+        user_docs = list(documents_collection.find(query, DOCUMENT_LIST_PROJECTION).sort("_id", -1).limit(limit))
+        next_cursor = str(user_docs[-1]["_id"]) if len(user_docs) == limit else None
+        for doc in user_docs:
+            del doc["_id"] # Exclude MongoDB default _id from results
         logger.info(f"Retrieved {len(user_docs)} documents for user_id: {user_id}")
-        return user_docs
+        return user_docs, next_cursor
     except Exception as e:
         logger.error(f"Error retrieving documents for user {user_id}: {e}")
-        return []
+        return None
 
 
 def add_chat_message(session_id: str, role: str, content: str) -> bool:
@@ -127,6 +196,7 @@ def add_chat_message(session_id: str, role: str, content: str) -> bool:
             "timestamp": datetime.utcnow() # Store timestamp
         }
         result = history_collection.insert_one(message_doc)
+        chat_history_cache.invalidate(session_id)
         logger.info(f"Chat message added for session {session_id}, role {role}. InsertedId: {result.inserted_id}")
         return True
     except Exception as e:
@@ -134,23 +204,83 @@ def add_chat_message(session_id: str, role: str, content: str) -> bool:
         return False
 
 
+def add_chat_messages(session_id: str, messages: List[Tuple[str, str]]) -> bool:
+    """Adds several (role, content) messages for a session in one insert_many round trip, keeping their order."""
+    db = get_db()
+    if db is None:
+        return False
+    if not messages:
+        return True
+    try:
+        history_collection: Collection = db[HISTORY_COLLECTION]
+        timestamp = datetime.utcnow() # Shared timestamp; readers break ties on _id (insertion order)
+        message_docs = [
+            {"session_id": session_id, "role": role, "content": content, "timestamp": timestamp}
+            for role, content in messages
+        ]
+        result = history_collection.insert_many(message_docs, ordered=True)
+        chat_history_cache.invalidate(session_id)
+        logger.info(f"{len(result.inserted_ids)} chat messages added for session {session_id}.")
+        return True
+    except Exception as e:
+        logger.error(f"Error adding chat messages for session {session_id}: {e}")
+        return False
+
+
 def  get_chat_history(session_id: str, limit: int = 50) -> List[Dict[str, Any]]:
-    """Retrieves the chat history for a specific session, ordered by timestamp."""
+    """Retrieves the chat history for a specific session, ordered by timestamp (cached briefly; treat as read-only)."""
+    history = chat_history_cache.get(session_id, lambda: _load_chat_history(session_id, limit), variant=limit)
+    return history if history is not None else []
+
+def _load_chat_history(session_id: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+    """Reads history from Mongo; returns None on failure so the empty result isn't cached."""
     db = get_db()
     if db is None:
-        return []
+        return None
     try:
         history_collection: Collection = db[HISTORY_COLLECTION]
         history = list(history_collection.find(
                 {"session_id": session_id},
-                {"_id": 0, "session_id": 0} # Exclude _id and session_id from results
-            ).sort("timestamp", 1).limit(limit) # Sort ascending (oldest first)
+                {**CHAT_MESSAGE_PROJECTION, "_id": 0} # Only role/content/timestamp
+            ).sort([("timestamp", 1), ("_id", 1)]).limit(limit) # Sort ascending (oldest first), _id breaks ties
         )
         logger.info(f"Retrieved {len(history)} chat messages for session_id: {session_id}")
         return history
     except Exception as e:
         logger.error(f"Error retrieving chat history for session {session_id}: {e}")
-        return []
+        return None
+
+
+def get_chat_history_page(session_id: str, limit: int = 50, before: Optional[str] = None, use_cache: bool = True) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Returns up to `limit` messages older than the `before` message id (newest page when None),
+    oldest first, plus the cursor for the next (older) page or None when there is no more.
+    With use_cache=False the newest page is always read from Mongo."""
+    if before is None and use_cache:
+        page = chat_history_cache.get(session_id, lambda: _load_chat_history_page(session_id, limit, None), variant=("page", limit))
+    else:
+        page = _load_chat_history_page(session_id, limit, before)
+    return page if page is not None else ([], None)
+
+def _load_chat_history_page(session_id: str, limit: int, before: Optional[str]) -> Optional[Tuple[List[Dict[str, Any]], Optional[str]]]:
+    db = get_db()
+    if db is None:
+        return None
+    try:
+        history_collection: Collection = db[HISTORY_COLLECTION]
+        query: Dict[str, Any] = {"session_id": session_id}
+        if before is not None:
+            query["_id"] = {"$lt": ObjectId(before)}
+        # _id order is insertion order, and _id is indexed, so no in-memory sort or skip() scan
+        messages = list(history_collection.find(query, CHAT_MESSAGE_PROJECTION).sort("_id", -1).limit(limit))
+        next_cursor = str(messages[-1]["_id"]) if len(messages) == limit else None
+        for message in messages:
+            message["id"] = str(message.pop("_id"))
+        messages.reverse() # Oldest first within the page
+        logger.info(f"Retrieved page of {len(messages)} chat messages for session_id: {session_id}")
+        return messages, next_cursor
+    except Exception as e:
+        logger.error(f"Error retrieving chat history page for session {session_id}: {e}")
+        return None
 
 
 def save_insight(session_id: str, insight: str) -> bool:
@@ -180,10 +310,10 @@ def get_insights(session_id: str) -> List[Dict[str, Any]]:
         return []
     try:
         insights_collection: Collection = db[INSIGHTS_COLLECTION]
-        # Find insights, remove session_id projection, keep _id for now
+        # Find insights, projecting only the fields InsightData needs (keep _id for the id)
         insights_cursor = insights_collection.find(
             {"session_id": session_id},
-            {"session_id": 0} # Only exclude session_id, keep _id
+            INSIGHT_PROJECTION
         ).sort("timestamp", 1)
         
         insights = []
@@ -305,13 +435,17 @@ async def delete_all_session_data(session_id: str) -> Dict[str, int]:
     try:
         # Delete document metadata
         doc_collection: Collection = db[DOCUMENTS_COLLECTION]
+        owner_ids = doc_collection.distinct("user_id", {"session_id": session_id})
         doc_result = doc_collection.delete_many({"session_id": session_id})
+        for owner_id in owner_ids:
+            document_list_cache.invalidate(owner_id)
         deleted_counts["documents_deleted"] = doc_result.deleted_count
         logger.info(f"Deleted {doc_result.deleted_count} document metadata entries for session {session_id}.")
         
         # Delete chat history
         hist_collection: Collection = db[HISTORY_COLLECTION]
         hist_result = hist_collection.delete_many({"session_id": session_id})
+        chat_history_cache.invalidate(session_id)
         deleted_counts["history_deleted"] = hist_result.deleted_count
         logger.info(f"Deleted {hist_result.deleted_count} chat history messages for session {session_id}.")
         
@@ -346,7 +480,7 @@ if __name__ == '__main__':
     save_document_metadata(test_session_id, test_filename, test_user_id, processed_at=datetime.utcnow())
 
     print(f"\n--- Getting Documents for User: {test_user_id} ---")
-    docs = get_user_documents(test_user_id)
+    docs, _ = get_user_documents(test_user_id)
     print(f"Found docs: {docs}")
 
     print(f"\n--- Adding Chat Messages (Session: {test_session_id}) ---")
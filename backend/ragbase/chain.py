@@ -1,10 +1,13 @@
+import asyncio
+import logging
 import re
+from functools import lru_cache
 from operator import itemgetter
 from typing import List, Dict
 from pathlib import Path
 import traceback
 
-from langchain.schema.runnable import RunnablePassthrough, RunnableParallel
+from langchain_core.runnables import RunnableParallel # Not the langchain.schema shim, which imports far more
 from langchain_core.documents import Document
 from langchain_core.language_models import BaseLanguageModel
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
@@ -17,9 +20,20 @@ from weaviate.classes.query import MetadataQuery
 from langchain_core.output_parsers import StrOutputParser
 
 from .config import Config
-from .ingest import COLLECTION_NAME, TEXT_KEY
+from .ingest import COLLECTION_NAME, TEXT_KEY, is_collection_ready
 from ..database import mongo_handler
 
+# Per-turn debug output goes through logging (lazy %-args, off unless DEBUG) instead of print()
+logger = logging.getLogger(__name__)
+
+# Settings read on every chat turn; fixed for the life of the process, so resolve them once here
+HISTORY_LIMIT = Config.CONVERSATION_MESSAGE_LIMIT
+SEARCH_K = Config.Retriever.SEARCH_K
+SEARCH_TYPE = Config.Retriever.SEARCH_TYPE
+USE_HYBRID_SEARCH = SEARCH_TYPE == "hybrid"
+HYBRID_ALPHA = Config.Retriever.HYBRID_ALPHA
+TARGET_VECTOR_NAME = "content_vector" # The name we gave our vector in ingest.py
+
 # --- Prompt Setup ---
 # Update SYSTEM_PROMPT to include chat_history instructions
 SYSTEM_PROMPT = (
@@ -30,30 +44,36 @@ SYSTEM_PROMPT = (
     "Context:\n{context}\n"
 )
 
+_URL_PATTERN = re.compile(r"https?://\S+|www\.\S+")
+
 def remove_links(text: str) -> str:
-    url_pattern = r"https?://\S+|www\.\S+"
-    return re.sub(url_pattern, "", text)
+    # Most chunks contain no link; two C-level substring scans are cheaper than a regex pass over every position
+    if "http" not in text and "www." not in text:
+        return text
+    return _URL_PATTERN.sub("", text)
+
+@lru_cache(maxsize=1024)
+def _source_name(source: str) -> str:
+    """Basename of a document source; memoized since the same few sources recur across queries."""
+    try:
+        return Path(source).name
+    except Exception:
+        return str(source)
 
 def format_docs(documents: List[Document]) -> str:
     """Formats retrieved documents (text and images) into a context string for the LLM."""
     formatted_context = []
-    print(f"\n--- DEBUG format_docs: Received {len(documents)} documents to format ---")
+    logger.debug("format_docs: received %d documents to format", len(documents))
     if not documents:
-        print("DEBUG format_docs: No documents received.")
         return "No relevant context found."
 
+    debug = logger.isEnabledFor(logging.DEBUG)
     for i, doc in enumerate(documents):
-        print(f"--- Document #{i+1} ---")
-        print(f"  Metadata: {doc.metadata}")
-        content = doc.page_content if doc.page_content else "[NO CONTENT]"
-        print(f"  Content Preview (first 200 chars):\n    {content[:200]}...")
-        print(f"---------------------")
+        if debug:
+            logger.debug("format_docs: document #%d metadata=%s preview=%r", i + 1, doc.metadata, (doc.page_content or "[NO CONTENT]")[:200])
         
         source = doc.metadata.get("source", "Unknown source")
-        try:
-            source_name = Path(source).name
-        except Exception:
-            source_name = str(source)
+        source_name = _source_name(source) if isinstance(source, str) else str(source)
 
         doc_type = doc.metadata.get("doc_type")
 
@@ -65,7 +85,7 @@ def format_docs(documents: List[Document]) -> str:
             page_info = f", page {page_num + 1}" if page_num is not None else ""
             content = doc.page_content
             if not content or not content.strip():
-                print(f"WARNING format_docs: Doc {i+1} (text) has empty page_content. Source: {source_name}{page_info}")
+                logger.warning("format_docs: Doc %d (text) has empty page_content. Source: %s%s", i + 1, source_name, page_info)
                 content = "[Content missing or empty]"
             else:
                 content = remove_links(content)
@@ -73,27 +93,25 @@ def format_docs(documents: List[Document]) -> str:
         else:
             content = doc.page_content
             if not content or not content.strip():
-                print(f"WARNING format_docs: Doc {i+1} (unknown/missing type) has empty page_content. Source: {source_name}")
+                logger.warning("format_docs: Doc %d (unknown/missing type) has empty page_content. Source: %s", i + 1, source_name)
                 content = "[Content missing or empty]"
             else:
                 content = remove_links(content)
             context_piece = f"[Context from: {source_name}]\n{content}"
 
         formatted_context.append(context_piece)
-        if i < len(documents) - 1:
-            formatted_context.append("---")
-
-    full_context = "\n".join(formatted_context).strip()
-    print(f"\n--- DEBUG format_docs: Final Context String --- ")
-    print(f"Length: {len(full_context)}")
-    print(f"Preview (first 500 chars):\n{full_context[:500]}...")
-    print("--- End Final Context ---")
+
+    full_context = "\n---\n".join(formatted_context).strip()
+    if debug:
+        logger.debug("format_docs: final context length=%d preview=%r", len(full_context), full_context[:500])
     return full_context if full_context else "No relevant context found."
 
-def get_session_history(session_id: str) -> ChatMessageHistory:
-    """Retrieves chat history from MongoDB and converts it to ChatMessageHistory object."""
-    # Use the MongoDB handler to get history
-    history_list: List[Dict] = mongo_handler.get_chat_history(session_id)
+def load_history_messages(session_id: str) -> List[BaseMessage]:
+    """Retrieves recent chat history from MongoDB as LangChain messages."""
+    # Only the newest CONVERSATION_MESSAGE_LIMIT messages go into the prompt, so only fetch those
+    # (projected, newest page via the _id index, returned oldest first).
+    # Not cached: every turn's save invalidates the cache, and another worker may have saved the last turn.
+    history_list, _ = mongo_handler.get_chat_history_page(session_id, limit=HISTORY_LIMIT, use_cache=False)
     
     # Convert the list of dicts to Langchain BaseMessage objects
     messages: List[BaseMessage] = []
@@ -106,40 +124,54 @@ def get_session_history(session_id: str) -> ChatMessageHistory:
             messages.append(AIMessage(content=content))
         # Add other roles (system, tool) if needed
         
-    print(f"DEBUG get_session_history: Retrieved {len(messages)} messages from MongoDB for session '{session_id}'")
-    return ChatMessageHistory(messages=messages)
+    logger.debug("load_history_messages: %d messages for session '%s'", len(messages), session_id)
+    return messages
+
+def get_session_history(session_id: str) -> ChatMessageHistory:
+    """Retrieves chat history from MongoDB and converts it to ChatMessageHistory object."""
+    return ChatMessageHistory(messages=load_history_messages(session_id))
 
 # --- Weaviate Retrieval (Multi-Tenant) ---
 def retrieve_context_weaviate(query: str, client: weaviate.Client, session_id: str) -> List[Document]:
-    """Retrieves context from Weaviate for a specific tenant using nearText vector search against the named vector."""
-    print(f"Retrieving context from Weaviate for tenant '{session_id}' using nearText with query: '{query[:50]}...'")
-    collection_name = COLLECTION_NAME # Use constant defined in ingest.py or Config
+    """Retrieves context from Weaviate for a specific tenant using nearText (or hybrid BM25 + vector) search against the named vector."""
+    logger.debug("Retrieving context from Weaviate for tenant '%s' with query: %r", session_id, query[:50])
     text_key = TEXT_KEY             # Use constant defined in ingest.py or Config
-    target_vector_name = "content_vector" # The name we gave our vector in ingest.py
 
     try:
-        if not client.collections.exists(collection_name):
-            print(f"  Warning: Collection '{collection_name}' does not exist. Cannot retrieve.")
+        if not is_collection_ready(client, COLLECTION_NAME): # Round trip only until the collection is first seen
+            print(f"  Warning: Collection '{COLLECTION_NAME}' does not exist. Cannot retrieve.")
             return []
 
-        collection = client.collections.get(collection_name)
+        collection = client.collections.get(COLLECTION_NAME)
         collection_tenant = collection.with_tenant(session_id)
 
-        response = collection_tenant.query.near_text(
-            query=query,
-            limit=Config.Retriever.SEARCH_K,
-            target_vector=target_vector_name,
-            return_metadata=MetadataQuery(distance=True)
-        )
+        if USE_HYBRID_SEARCH:
+            # BM25 + vector search fused server-side in one round trip; helps short keyword queries
+            response = collection_tenant.query.hybrid(
+                query=query,
+                alpha=HYBRID_ALPHA,
+                limit=SEARCH_K,
+                target_vector=TARGET_VECTOR_NAME,
+                return_metadata=MetadataQuery(score=True)
+            )
+        else:
+            response = collection_tenant.query.near_text(
+                query=query,
+                limit=SEARCH_K,
+                target_vector=TARGET_VECTOR_NAME,
+                return_metadata=MetadataQuery(distance=True)
+            )
         # ----------------------------------------------------------------------
 
         retrieved_docs = []
         if response and response.objects:
-             print(f"  Retrieved {len(response.objects)} nearText results from Weaviate.")
+             logger.debug("Retrieved %d %s results from Weaviate.", len(response.objects), SEARCH_TYPE)
              for obj in response.objects:
                  metadata = {k: v for k, v in obj.properties.items() if k != text_key}
                  if obj.metadata and obj.metadata.distance is not None:
                      metadata["distance_score"] = obj.metadata.distance
+                 if obj.metadata and obj.metadata.score is not None:
+                     metadata["hybrid_score"] = obj.metadata.score
                  doc = Document(
                      page_content=obj.properties.get(text_key, ""),
                      metadata=metadata
@@ -185,33 +217,44 @@ def create_chain(llm: BaseLanguageModel, client=None, retriever=None) -> Runnabl
     def get_context(inputs: dict) -> List[Document]: # Added type hint
         question = inputs["question"]
         session_id = inputs["session_id"] # Expects session_id here
-        print(f"DEBUG get_context called for session: {session_id}")
         if retriever:
-            print(f"Using local retriever for session '{session_id}'")
             try:
-                docs = retriever.get_relevant_documents(question)
-                print(f"Local retriever returned {len(docs)} docs.")
+                docs = retriever.invoke(question)
+                logger.debug("get_context: local retriever returned %d docs for session '%s'", len(docs), session_id)
                 return docs
             except Exception as e:
                  print(f"ERROR in local retriever: {e}")
                  traceback.print_exc()
                  return []
         elif client:
-            print(f"Using Weaviate retrieval for session '{session_id}'")
             # retrieve_context_weaviate already has error handling
             docs = retrieve_context_weaviate(question, client, session_id)
-            print(f"Weaviate retriever returned {len(docs)} docs.")
+            logger.debug("get_context: Weaviate returned %d docs for session '%s'", len(docs), session_id)
             return docs
         else:
             print(f"WARNING: No retriever or client available for session '{session_id}'")
             return []
 
-    # Function to get history messages (Now uses get_session_history which fetches from Mongo)
+    # Async twin used by astream_events/ainvoke/abatch: the local retriever's compressors
+    # (reranker, chain filter) score documents concurrently on the event loop instead of in threads
+    async def aget_context(inputs: dict) -> List[Document]:
+        if not retriever:
+            return await asyncio.to_thread(get_context, inputs)
+        question = inputs["question"]
+        session_id = inputs["session_id"]
+        try:
+            docs = await retriever.ainvoke(question)
+            logger.debug("get_context: local retriever returned %d docs for session '%s'", len(docs), session_id)
+            return docs
+        except Exception as e:
+             print(f"ERROR in local retriever: {e}")
+             traceback.print_exc()
+             return []
+
+    # Function to get history messages (fetches the latest turns from Mongo)
     def get_history_messages(inputs: dict) -> List[BaseMessage]: # Return type changed
-        session_id = inputs["session_id"] # Expects session_id here
-        print(f"DEBUG get_history_messages called for session: {session_id}")
-        history_obj = get_session_history(session_id) # Fetches from Mongo
-        return history_obj.messages
+        # The prompt only needs the message list, so skip building (and validating) a ChatMessageHistory
+        return load_history_messages(inputs["session_id"])
 
     # --- Define Parallel Steps --- 
     # Step 1: Prepare initial context dict with question and session_id
@@ -225,18 +268,22 @@ def create_chain(llm: BaseLanguageModel, client=None, retriever=None) -> Runnabl
         # Pass question directly through from Step 1's output
         question=itemgetter("question"),
         # Run get_context using the dict from Step 1
-        retrieved_docs=RunnableLambda(get_context, name="GetRelevantDocs"),
+        retrieved_docs=RunnableLambda(get_context, afunc=aget_context, name="GetRelevantDocs"),
         # Run get_history_messages using the dict from Step 1
         chat_history=RunnableLambda(get_history_messages, name="FetchHistoryMessages")
     ).with_config({"run_name": "FetchDocsAndHistory"})
 
+    # Adds the formatted context in one step; RunnablePassthrough.assign(context=itemgetter(...) | format_docs)
+    # would trace three runnables (assign, itemgetter, FormatDocs) and copy the dict through a parallel map
+    def add_context(inputs: dict) -> dict:
+        # Input: {'question':..., 'retrieved_docs':..., 'chat_history':...} from Step 2
+        # Output: {'question':..., 'retrieved_docs':..., 'chat_history':..., 'context':...}
+        return {**inputs, "context": format_docs(inputs["retrieved_docs"])}
+
     # Step 3: Format docs and prepare LLM input
     format_and_generate = RunnableParallel(
          answer = (
-             RunnablePassthrough.assign( # Input: {'question':..., 'retrieved_docs':..., 'chat_history':...} from Step 2
-                context = itemgetter("retrieved_docs") | RunnableLambda(format_docs, name="FormatDocs")
-                # Output: {'question':..., 'retrieved_docs':..., 'chat_history':..., 'context':...}
-             )
+             RunnableLambda(add_context, name="FormatDocs")
              # llm_chain now receives all required keys: 'question', 'chat_history', 'context'
              | llm_chain
          ),
@@ -263,14 +310,12 @@ def create_chain(llm: BaseLanguageModel, client=None, retriever=None) -> Runnabl
 # --- Function to save messages (NEW) ---
 def save_message_pair(session_id: str, user_query: str, ai_response: str):
     """Saves both the user query and the AI response to MongoDB."""
-    print(f"DEBUG save_message_pair: Saving user query and AI response for session {session_id}")
-    # Save user message
-    user_saved = mongo_handler.add_chat_message(session_id=session_id, role="user", content=user_query)
-    if not user_saved:
-        print(f"WARNING: Failed to save user message for session {session_id}")
-    
-    # Save AI message
-    ai_saved = mongo_handler.add_chat_message(session_id=session_id, role="assistant", content=ai_response)
-    if not ai_saved:
-        print(f"WARNING: Failed to save AI response for session {session_id}")
+    logger.debug("save_message_pair: saving user query and AI response for session %s", session_id)
+    # Save both messages in one round trip (user first, then assistant)
+    saved = mongo_handler.add_chat_messages(
+        session_id=session_id,
+        messages=[("user", user_query), ("assistant", ai_response)]
+    )
+    if not saved:
+        print(f"WARNING: Failed to save user query and AI response for session {session_id}")
 
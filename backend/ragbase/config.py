@@ -13,10 +13,16 @@ else:
 class Config:
     DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
     CONVERSATION_MESSAGE_LIMIT = int(os.getenv('CONVERSATION_MESSAGE_LIMIT', '6'))
+    USE_LOCAL_VECTOR_STORE = os.getenv('USE_LOCAL_VECTOR_STORE', 'False').lower() == 'true'
+    WARMUP_MODELS = os.getenv('WARMUP_MODELS', 'True').lower() == 'true' # Send a tiny LLM/embedding request at startup
+    STARTUP_WAIT_SECONDS = float(os.getenv('STARTUP_WAIT_SECONDS', '300')) # How long /api/ requests wait for background startup before a 503
+    CORS_ORIGIN_REGEX = os.getenv('CORS_ORIGIN_REGEX', r'https://[a-z0-9-]+\.vercel\.app') # Extra allowed origins (full match); empty disables
 
     class Path:
         APP_HOME = Path(os.getenv("APP_HOME", Path(__file__).resolve().parent.parent))
         # Local data paths removed as S3 is used for documents and potentially other artifacts.
+        PROCESSED_HASHES_FILE = Path(os.getenv("PROCESSED_HASHES_FILE", APP_HOME / "processed_hashes.json"))
+        FAISS_INDEX_DIR = Path(os.getenv("FAISS_INDEX_DIR", APP_HOME / "faiss_index")) # Only used when USE_LOCAL_VECTOR_STORE=true
     
     class Database:
         WEAVIATE_URL = os.getenv("WEAVIATE_URL")
@@ -24,6 +30,13 @@ class Config:
         WEAVIATE_INDEX_NAME = os.getenv("WEAVIATE_INDEX_NAME", "RaggerIndex")
         WEAVIATE_TEXT_KEY = "text"
         WEAVIATE_EMBEDDING_MODEL = os.getenv("WEAVIATE_EMBEDDING_MODEL", "Snowflake/snowflake-arctic-embed-l-v2.0") # Reinstated: Ensure this matches your Weaviate vectorizer module's model
+        # One client per process; its HTTP pool and gRPC channel are shared by concurrent requests
+        WEAVIATE_POOL_CONNECTIONS = int(os.getenv("WEAVIATE_POOL_CONNECTIONS", "20")) # Keep-alive connections kept open
+        WEAVIATE_POOL_MAXSIZE = int(os.getenv("WEAVIATE_POOL_MAXSIZE", "100")) # Max concurrent HTTP connections
+        WEAVIATE_TIMEOUT_INIT = float(os.getenv("WEAVIATE_TIMEOUT_INIT", "5")) # Seconds for connect/readiness checks
+        WEAVIATE_TIMEOUT_QUERY = float(os.getenv("WEAVIATE_TIMEOUT_QUERY", "10")) # Seconds per search; chat retrieval should fail fast
+        WEAVIATE_TIMEOUT_INSERT = float(os.getenv("WEAVIATE_TIMEOUT_INSERT", "90")) # Seconds per batch insert; ingestion batches are large
+        WEAVIATE_SKIP_INIT_CHECKS = os.getenv("WEAVIATE_SKIP_INIT_CHECKS", "False").lower() == "true" # Skip the meta/health round trips at connect once the cluster is known good
 
         # --- MongoDB Configuration --- 
         MONGO_CONNECTION_STRING = os.getenv("MONGO_CONNECTION_STRING")
@@ -39,6 +52,9 @@ class Config:
     class AWS:
         S3_BUCKET_NAME = os.getenv("AWS_S3_BUCKET_NAME")
         S3_REGION = os.getenv("AWS_S3_REGION")
+        UPLOAD_MULTIPART_THRESHOLD_MB = int(os.getenv("AWS_UPLOAD_MULTIPART_THRESHOLD_MB", "8")) # Larger uploads go multipart
+        UPLOAD_PART_SIZE_MB = int(os.getenv("AWS_UPLOAD_PART_SIZE_MB", "8"))
+        UPLOAD_MAX_CONCURRENCY = int(os.getenv("AWS_UPLOAD_MAX_CONCURRENCY", "4")) # Parts in flight per file
         # AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
         # AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 
@@ -48,6 +64,8 @@ class Config:
     class Embedding:
         PROVIDER = os.getenv("EMBEDDING_PROVIDER", "groq").lower() # e.g., groq, openai, azure_openai, huggingface_local, huggingface_inference
         MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "text-embedding-ada-002") # Ensure this is a valid Groq or other configured provider's model
+        SHARD_SIZE = int(os.getenv("EMBEDDING_SHARD_SIZE", "32")) # Texts per concurrent /api/embed request (async path)
+        QUERY_CACHE_SIZE = int(os.getenv("EMBEDDING_QUERY_CACHE_SIZE", "1024")) # Query embeddings kept in memory
         # OLLAMA_BASE_URL removed
         # DEVICE removed
         
@@ -56,10 +74,27 @@ class Config:
         MODEL_NAME = os.getenv("LLM_MODEL_NAME", "llama3-8b-8192") # Ensure this is a valid Groq model
         TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.4"))
         MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "8000"))
+        USE_NATIVE_GROQ = os.getenv("USE_NATIVE_GROQ", "False").lower() == "true" # Stream via the groq SDK instead of ChatGroq
         # OLLAMA_BASE_URL removed
     
+    class Ingest:
+        FETCH_WORKERS = int(os.getenv("INGEST_FETCH_WORKERS", "8")) # Parallel S3 downloads + hashing per processing run
+        CHUNK_WORKERS = int(os.getenv("INGEST_CHUNK_WORKERS", "4")) # Documents parsed/chunked in parallel per processing run
+        PDF_SPLIT_PAGE_COUNT = int(os.getenv("INGEST_PDF_SPLIT_PAGE_COUNT", "64")) # Larger PDFs are parsed in parts of this many pages; 0 disables
+        QUEUE_WORKERS = int(os.getenv("INGEST_QUEUE_WORKERS", "2")) # Background /api/process jobs run at once per worker process
+        QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "64")) # Jobs waiting beyond this are refused with 503
+
     class Retriever:
         USE_CHAIN_FILTER = os.getenv('USE_CHAIN_FILTER', 'False').lower() == 'true'
-        SEARCH_TYPE = os.getenv("RETRIEVER_SEARCH_TYPE", "similarity") # e.g., similarity, mmr
+        SEARCH_TYPE = os.getenv("RETRIEVER_SEARCH_TYPE", "similarity") # e.g., similarity, mmr, hybrid (Weaviate only)
+        HYBRID_ALPHA = float(os.getenv("RETRIEVER_HYBRID_ALPHA", "0.5")) # 0 = pure BM25, 1 = pure vector
         SEARCH_K = int(os.getenv("RETRIEVER_SEARCH_K", "5")) # Number of docs to retrieve
+        USE_RERANKER = os.getenv('USE_RERANKER', 'False').lower() == 'true'
+        RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20")) # Docs fetched and scored before trimming to SEARCH_K
+        RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "4096")) # (query, doc) scores kept in memory
+        RERANK_MIN_SCORE = float(os.getenv("RERANK_MIN_SCORE", "5")) # 0-10 cut-off when reranker and chain filter are fused
+        USE_SQ8 = os.getenv("FAISS_USE_SQ8", "False").lower() == "true" # Expect an int8 scalar-quantized index ("SQ8" / "IVF256,SQ8")
+        FAISS_OMP_THREADS = int(os.getenv("FAISS_OMP_THREADS", "2")) # Search threads per worker; aim for physical cores / uvicorn workers
+        FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16")) # Inverted lists probed per query on IVF indexes (e.g. "IVF256,PQ32", "OPQ32_128,IVF1024,PQ32")
+        FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64")) # Candidate list size per query on HNSW indexes (e.g. "HNSW32"); must be >= k
 
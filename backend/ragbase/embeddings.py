@@ -0,0 +1,117 @@
+# backend/ragbase/embeddings.py
+# Ollama embedding classes. Imported lazily from model.create_embeddings so deployments
+# that don't embed client-side (Weaviate vectorizes server-side) skip httpx/langchain-community.
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import httpx
+from langchain_community.embeddings import OllamaEmbeddings
+from .config import Config
+
+# Shared async client so concurrent shard requests reuse keep-alive connections.
+_async_http_client: Optional[httpx.AsyncClient] = None
+
+def _get_async_http_client() -> httpx.AsyncClient:
+    global _async_http_client
+    if _async_http_client is None or _async_http_client.is_closed:
+        _async_http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_keepalive_connections=40, max_connections=100, keepalive_expiry=30)
+        )
+    return _async_http_client
+
+# Query embeddings keyed by (model, text); repeated questions skip the Ollama round trip.
+_QUERY_EMBEDDING_CACHE: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+_QUERY_EMBEDDING_LOCK = threading.Lock()
+
+def _get_cached_query_embedding(key: Tuple[str, str]) -> Optional[List[float]]:
+    with _QUERY_EMBEDDING_LOCK:
+        embedding = _QUERY_EMBEDDING_CACHE.get(key)
+        if embedding is not None:
+            _QUERY_EMBEDDING_CACHE.move_to_end(key)
+        return embedding
+
+def _cache_query_embedding(key: Tuple[str, str], embedding: List[float]) -> None:
+    with _QUERY_EMBEDDING_LOCK:
+        _QUERY_EMBEDDING_CACHE[key] = embedding
+        _QUERY_EMBEDDING_CACHE.move_to_end(key)
+        while len(_QUERY_EMBEDDING_CACHE) > Config.Embedding.QUERY_CACHE_SIZE:
+            _QUERY_EMBEDDING_CACHE.popitem(last=False)
+
+class BatchOllamaEmbeddings(OllamaEmbeddings):
+    """OllamaEmbeddings that embeds a whole batch with one POST to /api/embed.
+
+    The stock implementation calls the legacy /api/embeddings endpoint once per text.
+    If the batch endpoint is unavailable (older Ollama) we fall back to that behaviour.
+    """
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        payload = {
+            "model": self.model,
+            "input": [f"{self.embed_instruction}{text}" for text in texts],
+            "options": self._default_params.get("options", {}),
+        }
+        try:
+            response = httpx.post(
+                f"{self.base_url}/api/embed",
+                json=payload,
+                headers=self.headers,
+                timeout=self.timeout or 60,
+            )
+            response.raise_for_status()
+            return response.json()["embeddings"]
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            print(f"WARNING: Batch /api/embed failed ({e}). Falling back to per-text embeddings.")
+            return super().embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embeds shards of the batch concurrently so OLLAMA_NUM_PARALLEL workers overlap."""
+        if not texts:
+            return []
+        shard_size = Config.Embedding.SHARD_SIZE
+        shards = [texts[i:i + shard_size] for i in range(0, len(texts), shard_size)]
+        client = _get_async_http_client()
+        options = self._default_params.get("options", {})
+
+        async def embed_shard(shard: List[str]) -> List[List[float]]:
+            response = await client.post(
+                f"{self.base_url}/api/embed",
+                json={
+                    "model": self.model,
+                    "input": [f"{self.embed_instruction}{text}" for text in shard],
+                    "options": options,
+                },
+                headers=self.headers,
+                timeout=self.timeout or 60,
+            )
+            response.raise_for_status()
+            return response.json()["embeddings"]
+
+        try:
+            results = await asyncio.gather(*[embed_shard(shard) for shard in shards])
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            print(f"WARNING: Concurrent /api/embed failed ({e}). Falling back to synchronous batch embedding.")
+            return await asyncio.to_thread(self.embed_documents, texts)
+        return [embedding for shard_embeddings in results for embedding in shard_embeddings]
+
+class CachedOllamaEmbeddings(BatchOllamaEmbeddings):
+    """BatchOllamaEmbeddings with a bounded, process-wide LRU cache for query embeddings."""
+
+    def embed_query(self, text: str) -> List[float]:
+        key = (self.model, text)
+        embedding = _get_cached_query_embedding(key)
+        if embedding is None:
+            embedding = super().embed_query(text)
+            _cache_query_embedding(key, embedding)
+        return list(embedding)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = (self.model, text)
+        embedding = _get_cached_query_embedding(key)
+        if embedding is None:
+            embedding = await super().aembed_query(text)
+            _cache_query_embedding(key, embedding)
+        return list(embedding)
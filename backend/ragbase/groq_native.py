@@ -0,0 +1,89 @@
+# backend/ragbase/groq_native.py
+# Thin chat model over the official groq SDK (httpx + SSE), used instead of ChatGroq when
+# Config.LLM.USE_NATIVE_GROQ is set. It subclasses BaseChatModel so astream_events still
+# emits on_chat_model_stream tokens for the /api/chat endpoint.
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from groq import AsyncGroq, Groq
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr, SecretStr
+
+_ROLES = {"system": "system", "human": "user", "ai": "assistant"}
+
+def _to_groq_messages(messages: List[BaseMessage]) -> List[Dict[str, str]]:
+    return [{"role": _ROLES.get(m.type, "user"), "content": m.content} for m in messages]
+
+class GroqNativeChatModel(BaseChatModel):
+    """Minimal streaming chat model backed by groq.Groq / groq.AsyncGroq."""
+
+    api_key: SecretStr
+    model_name: str
+    temperature: float = 0.4
+    max_tokens: Optional[int] = None
+    _client: Groq = PrivateAttr()
+    _async_client: AsyncGroq = PrivateAttr()
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._client = Groq(api_key=self.api_key.get_secret_value())
+        self._async_client = AsyncGroq(api_key=self.api_key.get_secret_value())
+
+    @property
+    def _llm_type(self) -> str:
+        return "groq-native"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name, "temperature": self.temperature}
+
+    def _request_params(self, messages: List[BaseMessage], stop: Optional[List[str]], **kwargs: Any) -> Dict[str, Any]:
+        params = {
+            "model": self.model_name,
+            "messages": _to_groq_messages(messages),
+            "temperature": self.temperature,
+            "max_tokens": kwargs.get("max_tokens", self.max_tokens),
+        }
+        if stop:
+            params["stop"] = stop
+        return params
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        response = self._client.chat.completions.create(**self._request_params(messages, stop, **kwargs))
+        content = response.choices[0].message.content or ""
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        response = await self._async_client.chat.completions.create(**self._request_params(messages, stop, **kwargs))
+        content = response.choices[0].message.content or ""
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        stream = self._client.chat.completions.create(stream=True, **self._request_params(messages, stop, **kwargs))
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            token = chunk.choices[0].delta.content
+            if token:
+                generation_chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+                if run_manager:
+                    run_manager.on_llm_new_token(token, chunk=generation_chunk)
+                yield generation_chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        stream = await self._async_client.chat.completions.create(stream=True, **self._request_params(messages, stop, **kwargs))
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            token = chunk.choices[0].delta.content
+            if token:
+                generation_chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+                if run_manager:
+                    await run_manager.on_llm_new_token(token, chunk=generation_chunk)
+                yield generation_chunk
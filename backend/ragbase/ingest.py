@@ -1,16 +1,18 @@
-import os
+import io
 import json
 import time
 import hashlib
+import threading
 import traceback
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Set, Tuple
 from pathlib import Path
 
 import weaviate
 from weaviate.util import generate_uuid5 # Example for generating IDs
 from langchain_core.documents import Document # Ensure Document is imported
 
-from langchain_community.document_loaders import UnstructuredFileLoader # Assuming this loader
+from langchain_community.document_loaders import UnstructuredFileIOLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 # Import Weaviate configuration classes
@@ -26,18 +28,19 @@ from .config import Config
 # Import Tenant class
 from weaviate.collections.classes.tenants import Tenant
 from weaviate.classes.query import Filter # Ensure Filter is imported
+from weaviate.classes.aggregate import GroupByAggregate
 
 # Add AWS Boto3 specific imports if needed, e.g.:
 import boto3
 from botocore.exceptions import ClientError
-import tempfile # For temporary file handling if downloading from S3
-# import io
 
 # --- Configuration --- 
 COLLECTION_NAME = "RaggerIndex" # Define collection name globally
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 150
 TEXT_KEY = "text" # Consistent key for text property
+# Tuple so listings can filter with one str.endswith call per key
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".txt", ".md", ".xlsx", ".csv")
 
 def get_file_hash(file_content: bytes) -> str:
     """Calculates SHA256 hash from bytes."""
@@ -45,16 +48,62 @@ def get_file_hash(file_content: bytes) -> str:
     hasher.update(file_content)
     return hasher.hexdigest()
 
+def fetch_and_hash_s3_object(s3_client, s3_key: str) -> Tuple[Optional[bytes], Optional[str]]:
+    """Downloads one S3 object and hashes it. Returns (None, None) on failure (already logged)."""
+    try:
+        s3_response_object = s3_client.get_object(Bucket=Config.AWS.S3_BUCKET_NAME, Key=s3_key)
+        file_content_bytes = s3_response_object['Body'].read()
+        print(f"  Successfully fetched {len(file_content_bytes)} bytes from S3 for {s3_key}")
+    except ClientError as e:
+        error_code = e.response.get("Error", {}).get("Code")
+        if error_code == 'NoSuchKey':
+            print(f"  ERROR: S3 object {s3_key} not found (NoSuchKey). Maybe deleted after list? Skipping.")
+        else:
+            print(f"  ERROR (ClientError) fetching S3 object {s3_key}: {e}. Skipping.")
+        return None, None
+    except Exception as e:
+        print(f"  Unexpected ERROR fetching S3 object {s3_key}: {e}. Skipping.")
+        traceback.print_exc()
+        return None, None
+    if not file_content_bytes:
+        return None, None
+    # /api/upload stores the SHA256 as object metadata; only hash here for objects uploaded without it
+    stored_hash = s3_response_object.get('Metadata', {}).get('sha256')
+    return file_content_bytes, stored_hash or get_file_hash(file_content=file_content_bytes)
+
+# Collections already confirmed or created by this process; collections are never dropped at runtime,
+# so later runs can skip the exists() round trip.
+_READY_COLLECTIONS: Set[str] = set()
+# Tenants this process has confirmed or created. If another worker removed one, that run's inserts fail
+# and the tenant is forgotten, so the retry re-creates it.
+_KNOWN_TENANTS: Set[str] = set()
+
+def is_collection_ready(client: weaviate.Client, collection_name: str = COLLECTION_NAME) -> bool:
+    """collections.exists() with the positive answer memoized per process."""
+    if collection_name in _READY_COLLECTIONS:
+        return True
+    if client.collections.exists(collection_name):
+        _READY_COLLECTIONS.add(collection_name)
+        return True
+    return False
+
+def forget_tenant(tenant_id: str) -> None:
+    """Call after removing a tenant so the next processing run re-creates it."""
+    _KNOWN_TENANTS.discard(tenant_id)
+
 def ensure_collection_exists(client: weaviate.Client):
     """Checks if the collection exists. If not, creates it. If it exists, returns the handle without deep verification."""
     collection_name = COLLECTION_NAME
     expected_vectorizer_model = Config.Database.WEAVIATE_EMBEDDING_MODEL # Still needed for creation
 
+    if collection_name in _READY_COLLECTIONS:
+        return client.collections.get(collection_name) # Local handle, no request
     if client.collections.exists(collection_name):
         print(f"Collection '{collection_name}' exists. Assuming configuration is correct and returning handle.")
         # --- Skip verification, just get the existing collection ---
         try:
              collection = client.collections.get(collection_name)
+             _READY_COLLECTIONS.add(collection_name)
              return collection
         except Exception as e:
              print(f"!!!!!!!! ERROR getting existing collection '{collection_name}': {e} !!!!!!!!")
@@ -88,6 +137,7 @@ def ensure_collection_exists(client: weaviate.Client):
             )
             print(f"Collection '{collection_name}' created successfully with Weaviate Embeddings vectorizer and Multi-Tenancy enabled.")
             time.sleep(2) # Allow time for creation to settle
+            _READY_COLLECTIONS.add(collection_name)
             return collection # Return the newly created collection object
         except Exception as e:
             print(f"!!!!!!!! FATAL ERROR: Failed to create collection '{collection_name}' !!!!!!!!")
@@ -96,42 +146,48 @@ def ensure_collection_exists(client: weaviate.Client):
             raise e
         # -------------------------------------------------------------------
 
-def add_chunks_to_weaviate(client: weaviate.Client, tenant_id: str, chunks: List[Document], text_key: str = TEXT_KEY):
-    """Adds document chunks to Weaviate one by one for a specific tenant with individual error checking."""
+def add_chunks_to_weaviate(client: weaviate.Client, tenant_id: str, chunks: List[Document], text_key: str = TEXT_KEY, create_tenant: bool = True) -> Set[str]:
+    """Adds document chunks (possibly from several documents) to a tenant in a single dynamic batch.
+
+    Pass create_tenant=False when the caller has already made sure the tenant exists, to skip the tenant lookup.
+
+    Returns the doc_hash values of documents that had at least one chunk fail; empty means everything was inserted.
+    """
     
-    print(f"Ingestor: Preparing to add {len(chunks)} chunks one-by-one to tenant '{tenant_id}'...")
+    print(f"Ingestor: Preparing to batch-add {len(chunks)} chunks to tenant '{tenant_id}'...")
     collection_name = COLLECTION_NAME
+    all_hashes = {chunk.metadata.get('doc_hash') for chunk in chunks}
     
-    if not client.collections.exists(collection_name):
+    if not is_collection_ready(client, collection_name):
         # This case should ideally be prevented by ensure_collection_exists
         print(f"Collection '{collection_name}' not found during chunk addition. Cannot proceed.")
-        return False
+        return all_hashes
     
     try:
         collection = client.collections.get(collection_name)
         
-        tenants = collection.tenants.get()
-        tenant_exists = any(t.name == tenant_id for t in tenants.values()) # Simplified check
-        
-        if not tenant_exists:
-            print(f"Ingestor: Tenant '{tenant_id}' not found, creating it.")
-            collection.tenants.create(Tenant(name=tenant_id))
-            print(f"Created tenant '{tenant_id}'")
-        else:
-            print(f"Tenant '{tenant_id}' already exists")
+        if create_tenant and tenant_id not in _KNOWN_TENANTS:
+            # Targeted lookup; listing every tenant grows with the number of sessions
+            if not collection.tenants.exists(tenant_id):
+                print(f"Ingestor: Tenant '{tenant_id}' not found, creating it.")
+                collection.tenants.create(Tenant(name=tenant_id))
+                print(f"Created tenant '{tenant_id}'")
+            else:
+                print(f"Tenant '{tenant_id}' already exists")
+            _KNOWN_TENANTS.add(tenant_id)
         
         collection_tenant = collection.with_tenant(tenant_id)
         print(f"  Obtained handle for tenant '{tenant_id}'.")
     except Exception as e:
         print(f"!!!!!!!! ERROR setting up tenant '{tenant_id}': {e} !!!!!!!!")
         traceback.print_exc()
-        return False
+        return all_hashes
     
     successful_inserts = 0
     failed_inserts = 0
-    source_identifier = chunks[0].metadata.get('source', 'Unknown') if chunks else 'Unknown'
+    failed_hashes: Set[str] = set()
 
-    print(f"  Starting individual inserts for {len(chunks)} chunks...")
+    print(f"  Queueing {len(chunks)} chunks into the batch...")
     with collection_tenant.batch.dynamic() as batch:
         for i, chunk in enumerate(chunks):
             if not hasattr(chunk, 'page_content') or not chunk.page_content:
@@ -166,30 +222,49 @@ def add_chunks_to_weaviate(client: weaviate.Client, tenant_id: str, chunks: List
                 )
                 successful_inserts += 1
             except Exception as insert_e:
-                print(f"  ERROR adding chunk {i+1} ({source_identifier}): {insert_e}")
+                print(f"  ERROR adding chunk {i+1} ({chunk.metadata.get('source', 'Unknown')}): {insert_e}")
                 failed_inserts += 1
+                failed_hashes.add(chunk.metadata.get('doc_hash'))
 
     # Check batch results (optional but recommended)
     if batch.number_errors > 0:
         print(f"!!!!!!!! WARNING: Batch insertion for tenant '{tenant_id}' finished with {batch.number_errors} errors !!!!!!!!")
+        failed_hashes.update(error.object_.properties.get('doc_hash') for error in collection_tenant.batch.failed_objects)
+
+    print(f"  Finished inserting chunks for tenant '{tenant_id}': {successful_inserts} queued, {failed_inserts} failed before sending, {batch.number_errors} rejected by Weaviate.")
+    return failed_hashes
+
+def get_existing_doc_hashes(collection_tenant, candidate_hashes: List[str]) -> Optional[Set[str]]:
+    """Returns which of candidate_hashes already have chunks in the tenant, in one aggregate request.
 
-    print(f"  Finished inserting chunks for tenant '{tenant_id}': {successful_inserts} succeeded, {failed_inserts} failed.")
-    return failed_inserts == 0
+    Returns None if the query fails, so callers can fall back to per-hash lookups.
+    """
+    if not candidate_hashes:
+        return set()
+    try:
+        response = collection_tenant.aggregate.over_all(
+            filters=Filter.by_property("doc_hash").contains_any(candidate_hashes),
+            group_by=GroupByAggregate(prop="doc_hash", limit=len(candidate_hashes)),
+            total_count=True
+        )
+        return {group.grouped_by.value for group in response.groups}
+    except Exception as e:
+        print(f"  Warning: Batched doc_hash lookup failed, checking hashes one by one: {e}")
+        return None
+
+def load_and_chunk_docs(file_content: bytes, filename_for_loader: str = "unknown_file", chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP) -> Optional[List[Document]]:
+    """Loads a document (from content) and splits it into chunks.
 
-def load_and_chunk_docs(file_content: bytes, filename_for_loader: str = "unknown_file", chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP) -> List[Document]:
-    """Loads a document (from content) and splits it into chunks."""
-    temp_file_path_for_loader = None # Initialize to ensure it's in scope for finally
+    The bytes are partitioned from memory; metadata_filename lets Unstructured detect the file type from the name.
+    Returns None if loading fails, so callers can tell a parse error from a document with no text.
+    """
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=Path(filename_for_loader).suffix or ".tmp") as tmp_file:
-            tmp_file.write(file_content)
-            temp_file_path_for_loader = tmp_file.name
-        print(f"Ingestor: Loading document from temporary file (from content): {temp_file_path_for_loader} (original: {filename_for_loader})")
-        loader_path = temp_file_path_for_loader
-
-        loader = UnstructuredFileLoader(
-             loader_path,
+        print(f"Ingestor: Loading document from memory: {filename_for_loader}")
+        loader = UnstructuredFileIOLoader(
+             io.BytesIO(file_content),
              mode="elements", 
-             strategy="fast"
+             strategy="fast",
+             metadata_filename=filename_for_loader
         )
         docs = loader.load()
         print(f"Ingestor: Loaded {len(docs)} elements initially from {filename_for_loader}.")
@@ -205,18 +280,59 @@ def load_and_chunk_docs(file_content: bytes, filename_for_loader: str = "unknown
         original_source = filename_for_loader
         print(f"Error loading/chunking document {original_source}: {e}")
         traceback.print_exc() # Added for more detail on chunking errors
-        return []
-    finally:
-        if temp_file_path_for_loader and os.path.exists(temp_file_path_for_loader):
+        return None
+
+# PDFium is not thread-safe, and splitting can run from several ingestion threads at once
+_PDFIUM_LOCK = threading.Lock()
+
+def split_pdf(file_content: bytes, pages_per_part: int) -> List[Tuple[bytes, int]]:
+    """Splits a PDF into sub-PDFs of at most pages_per_part pages so they can be parsed in parallel.
+
+    Returns [(part_bytes, page_offset)]; the whole file as one part if it is small, splitting is disabled,
+    or pypdfium2 is unavailable or can't open it.
+    """
+    if pages_per_part <= 0:
+        return [(file_content, 0)]
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        return [(file_content, 0)]
+    try:
+        with _PDFIUM_LOCK:
+            pdf = pdfium.PdfDocument(file_content)
             try:
-                os.remove(temp_file_path_for_loader)
-            except Exception as e:
-                print(f"Warning: Could not delete temporary file {temp_file_path_for_loader}: {e}")
+                page_count = len(pdf)
+                if page_count <= pages_per_part:
+                    return [(file_content, 0)]
+                parts = []
+                for start in range(0, page_count, pages_per_part):
+                    part = pdfium.PdfDocument.new()
+                    part.import_pages(pdf, list(range(start, min(start + pages_per_part, page_count))))
+                    buffer = io.BytesIO()
+                    part.save(buffer)
+                    part.close()
+                    parts.append((buffer.getvalue(), start))
+                return parts
+            finally:
+                pdf.close()
+    except Exception as e:
+        print(f"Warning: Could not split PDF, parsing it whole: {e}")
+        return [(file_content, 0)]
+
+def load_and_chunk_part(file_content: bytes, filename: str, page_offset: int) -> Optional[List[Document]]:
+    """load_and_chunk_docs for one part of a split PDF, shifting page numbers back to the original document's."""
+    chunks = load_and_chunk_docs(file_content=file_content, filename_for_loader=filename)
+    if chunks and page_offset:
+        for chunk in chunks:
+            if isinstance(chunk.metadata.get('page_number'), int):
+                chunk.metadata['page_number'] += page_offset
+    return chunks
 
 # --- UPDATED Main Processing Function --- 
-def process_files_for_session(session_id: str, client: weaviate.Client = None) -> Dict[str, Any]:
+def process_files_for_session(session_id: str, client: weaviate.Client = None, s3_client=None) -> Dict[str, Any]:
     """Processes uploaded files for a given session_id from AWS S3,
-    checking for existing hashes within the session's tenant before ingestion."""
+    checking for existing hashes within the session's tenant before ingestion.
+    Pass the process-wide s3_client to reuse its connection pool; a new client is created otherwise."""
     if not client:
         print("ERROR: Weaviate client is required for processing.")
         return {"message": "Processing failed: Weaviate client not available.", "processed_files": [], "skipped_count": 0, "failed_files": []}
@@ -226,9 +342,10 @@ def process_files_for_session(session_id: str, client: weaviate.Client = None) -
     s3_object_prefix = f"tenants/{session_id}/"
 
     # --- AWS S3 Client Initialization ---
-    s3_client_boto = None 
+    s3_client_boto = s3_client
     try:
-        s3_client_boto = boto3.client('s3', region_name=Config.AWS.S3_REGION)
+        if s3_client_boto is None:
+            s3_client_boto = boto3.client('s3', region_name=Config.AWS.S3_REGION)
     except Exception as e:
         error_msg = f"INGEST: ERROR initializing AWS S3 client: {e}"
         print(error_msg)
@@ -250,11 +367,14 @@ def process_files_for_session(session_id: str, client: weaviate.Client = None) -
         return {"message": error_msg, "processed_files": [], "skipped_count": 0, "failed_files": []}
 
     try:
-        if not collection.tenants.exists(session_id):
+        if session_id in _KNOWN_TENANTS:
+            pass # Confirmed by an earlier run in this process
+        elif not collection.tenants.exists(session_id):
             collection.tenants.create(Tenant(name=session_id))
             print(f"Weaviate Tenant '{session_id}' created successfully.")
         else:
             print(f"Weaviate Tenant '{session_id}' already exists.")
+        _KNOWN_TENANTS.add(session_id)
     except Exception as e:
         error_msg = f"Error checking or creating Weaviate tenant '{session_id}': {e}"
         print(f"!!!!!!!! {error_msg} !!!!!!!!")
@@ -278,9 +398,11 @@ def process_files_for_session(session_id: str, client: weaviate.Client = None) -
         for page in paginator.paginate(Bucket=Config.AWS.S3_BUCKET_NAME, Prefix=s3_object_prefix):
             if 'Contents' in page:
                 for obj in page['Contents']:
-                    # Skip "directory placeholder" objects (ending with '/' and size 0)
-                    if not (obj['Key'].endswith('/') and obj.get('Size', 0) == 0):
-                        objects_to_process_s3.append(obj) 
+                    # Also skips "directory placeholder" objects (keys ending with '/')
+                    if obj['Key'].lower().endswith(SUPPORTED_EXTENSIONS):
+                        objects_to_process_s3.append(obj)
+                    else:
+                        print(f"  Skipping S3 object with unsupported extension: {obj['Key']}") 
     except ClientError as e:
         error_msg = f"INGEST: S3 ClientError listing objects for prefix {s3_object_prefix}: {e}"
         print(error_msg)
@@ -297,8 +419,19 @@ def process_files_for_session(session_id: str, client: weaviate.Client = None) -
 
     print(f"Found {len(objects_to_process_s3)} object(s) in S3 to potentially process.")
 
-    for s3_object_summary in objects_to_process_s3: 
-        s3_key = s3_object_summary['Key']
+    # Download and hash all objects in parallel (network I/O and hashlib both release the GIL)
+    object_keys = [obj['Key'] for obj in objects_to_process_s3]
+    fetch_workers = min(len(object_keys), Config.Ingest.FETCH_WORKERS)
+    with ThreadPoolExecutor(max_workers=fetch_workers) as executor:
+        fetched_objects = list(executor.map(lambda key: fetch_and_hash_s3_object(s3_client_boto, key), object_keys))
+
+    # Pass 1: drop failed fetches and documents already ingested into this tenant
+    existing_hashes = get_existing_doc_hashes(
+        collection_tenant, list({file_hash for _, file_hash in fetched_objects if file_hash})
+    )
+    docs_to_ingest: List[Tuple[str, bytes, str]] = [] # (filename, content, hash)
+    hashes_in_run: Set[str] = set() # Same content under two names in one run is ingested once
+    for s3_key, (file_content_bytes, file_hash) in zip(object_keys, fetched_objects): 
         filename = Path(s3_key).name
         if not filename: # Should not happen if endsWith('/') check worked
             print(f"  Skipping S3 object with no filename (key: {s3_key})")
@@ -307,79 +440,113 @@ def process_files_for_session(session_id: str, client: weaviate.Client = None) -
         print(f"Processing S3 object: {s3_key} (filename: {filename})...")
 
         try:
-            file_content_bytes = None
-            try:
-                s3_response_object = s3_client_boto.get_object(Bucket=Config.AWS.S3_BUCKET_NAME, Key=s3_key)
-                file_content_bytes = s3_response_object['Body'].read() 
-                print(f"  Successfully fetched {len(file_content_bytes)} bytes from S3 for {filename}")
-            except ClientError as e:
-                error_code = e.response.get("Error", {}).get("Code")
-                if error_code == 'NoSuchKey':
-                    print(f"  ERROR: S3 object {s3_key} not found (NoSuchKey). Maybe deleted after list? Skipping.")
-                else:
-                    print(f"  ERROR (ClientError) fetching S3 object {s3_key}: {e}. Skipping.")
-                failed_files.append(filename)
-                continue 
-            except Exception as e:
-                print(f"  Unexpected ERROR fetching S3 object {s3_key}: {e}. Skipping.")
-                traceback.print_exc()
-                failed_files.append(filename)
-                continue 
-            
             if not file_content_bytes:
-                # This case should ideally be caught by previous error handling
+                # Fetch errors were logged by fetch_and_hash_s3_object
                 print(f"  No content fetched from S3 for {filename}. Skipping.")
                 failed_files.append(filename)
                 continue
 
-            file_hash = get_file_hash(file_content=file_content_bytes)
+            if file_hash in hashes_in_run:
+                print(f"  Skipping (same content as another file in this run): {filename}")
+                skipped_count += 1
+                continue
 
-            print(f"  Checking if hash {file_hash[:8]}... exists in Weaviate tenant '{session_id}'")
-            response = collection_tenant.query.fetch_objects(
-                filters=Filter.by_property("doc_hash").equal(file_hash),
-                limit=1
-            )
-            if len(response.objects) > 0:
+            if existing_hashes is not None:
+                hash_exists = file_hash in existing_hashes
+            else:
+                print(f"  Checking if hash {file_hash[:8]}... exists in Weaviate tenant '{session_id}'")
+                response = collection_tenant.query.fetch_objects(
+                    filters=Filter.by_property("doc_hash").equal(file_hash),
+                    limit=1
+                )
+                hash_exists = len(response.objects) > 0
+            if hash_exists:
                 print(f"  Skipping (hash already exists in Weaviate tenant '{session_id}'): {filename}")
                 skipped_count += 1
                 continue
             else:
                  print(f"  Hash not found in Weaviate tenant '{session_id}'. Proceeding with ingestion.")
+            docs_to_ingest.append((filename, file_content_bytes, file_hash))
+            hashes_in_run.add(file_hash)
+        except Exception as e:
+            print(f"!!!!!!!! ERROR checking file {filename} against Weaviate: {e} !!!!!!!!")
+            traceback.print_exc()
+            failed_files.append(filename)
 
-            chunks = load_and_chunk_docs(file_content=file_content_bytes, filename_for_loader=filename)
+    # Pass 2: parse and chunk in parallel (Unstructured spends much of its time in native code and file I/O).
+    # Large PDFs are split first so a single long document is spread over several workers too.
+    chunked_docs: List[Optional[List[Document]]] = [[] for _ in docs_to_ingest] # None once any part fails to parse
+    parts: List[Tuple[int, bytes, int]] = [] # (index into docs_to_ingest, content, page offset)
+    for doc_index, (filename, file_content_bytes, _) in enumerate(docs_to_ingest):
+        if filename.lower().endswith(".pdf"):
+            for part_content, page_offset in split_pdf(file_content_bytes, Config.Ingest.PDF_SPLIT_PAGE_COUNT):
+                parts.append((doc_index, part_content, page_offset))
+        else:
+            parts.append((doc_index, file_content_bytes, 0))
+    if parts:
+        chunk_workers = min(len(parts), Config.Ingest.CHUNK_WORKERS)
+        with ThreadPoolExecutor(max_workers=chunk_workers) as executor:
+            part_chunks = list(executor.map(
+                lambda part: load_and_chunk_part(part[1], docs_to_ingest[part[0]][0], part[2]), parts
+            ))
+        for (doc_index, _, _), chunks in zip(parts, part_chunks):
+            if chunks is None:
+                chunked_docs[doc_index] = None
+            elif chunked_docs[doc_index] is not None:
+                chunked_docs[doc_index].extend(chunks)
+
+    # Pass 3: tag chunks, then insert every document's chunks in one batch for the tenant
+    batch_chunks: List[Document] = []
+    batched_docs: List[Tuple[str, str]] = [] # (filename, hash) of documents in the batch
+    for (filename, _, file_hash), chunks in zip(docs_to_ingest, chunked_docs):
+        if chunks is None:
+            # Ingesting the parts that did parse would store doc_hash, and later runs would skip the file for good
+            print(f"  Failed to parse {filename} (or part of it). Skipping so it can be retried.")
+            failed_files.append(filename)
+            continue
+        if not chunks:
+            print(f"  No usable content extracted by Unstructured from {filename}. Skipping.")
+            failed_files.append(filename)
+            continue
 
-            if not chunks:
-                print(f"  No usable content extracted by Unstructured from {filename}. Skipping.")
-                failed_files.append(filename)
-                continue
+        for chunk in chunks:
+            chunk.metadata['doc_hash'] = file_hash
+            if 'source' not in chunk.metadata:
+                chunk.metadata['source'] = filename 
+        batch_chunks.extend(chunks)
+        batched_docs.append((filename, file_hash))
 
-            for chunk in chunks:
-                chunk.metadata['doc_hash'] = file_hash
-                if 'source' not in chunk.metadata:
-                    chunk.metadata['source'] = filename 
-            
-            print(f"  Adding {len(chunks)} chunks to Weaviate tenant '{session_id}'...")
-            ingestion_success = add_chunks_to_weaviate(client, session_id, chunks) 
-            
-            if ingestion_success:
+    if batch_chunks:
+        try:
+            print(f"  Adding {len(batch_chunks)} chunks from {len(batched_docs)} document(s) to Weaviate tenant '{session_id}'...")
+            # The tenant was checked/created at the start of this run
+            failed_hashes = add_chunks_to_weaviate(client, session_id, batch_chunks, create_tenant=False)
+        except Exception as e:
+            print(f"!!!!!!!! ERROR batch-ingesting into Weaviate tenant '{session_id}': {e} !!!!!!!!")
+            traceback.print_exc()
+            failed_hashes = {file_hash for _, file_hash in batched_docs}
+        if failed_hashes:
+            forget_tenant(session_id) # Re-check the tenant on the next run in case it is gone
+
+        for filename, file_hash in batched_docs:
+            if file_hash in failed_hashes:
+                print(f"  Failed to ingest chunks for: {filename}")
+                failed_files.append(filename)
+            else:
                 print(f"  Successfully processed and ingested: {filename}")
                 processed_count += 1
                 processed_filenames.append(filename)
-            else:
-                print(f"  Failed to ingest chunks for: {filename}")
-                failed_files.append(filename)
-
-        except Exception as e:
-            print(f"!!!!!!!! ERROR processing file {filename} (after S3 fetch and during Weaviate/chunking): {e} !!!!!!!!")
-            traceback.print_exc()
-            failed_files.append(filename)
 
     end_time = time.time()
+    print(f"Ingest: reused {skipped_count} already-ingested document(s), embedded {processed_count} new ({len(batch_chunks)} chunks sent).")
     result = {
         "message": f"Processing finished for session {session_id} in {end_time - start_time:.2f} seconds.",
         "processed_files": processed_filenames,
         "skipped_count": skipped_count,
-        "failed_files": failed_files
+        "failed_files": failed_files,
+        "reused_count": skipped_count,
+        "embedded_count": processed_count,
+        "embedded_chunk_count": len(batch_chunks)
     }
     print(f"Processing result: {result}")
     return result
\ No newline at end of file
@@ -1,12 +1,85 @@
-from langchain_community.chat_models import ChatOllama
-from langchain_community.document_compressors.flashrank_rerank import FlashrankRerank
-from langchain_community.embeddings import OllamaEmbeddings
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import BaseDocumentCompressor, Document
 from langchain_core.embeddings import Embeddings
 from langchain_core.language_models import BaseLanguageModel
-from langchain_groq import ChatGroq
+from pydantic import PrivateAttr
 from .config import Config
 
+# Provider SDKs (langchain_groq, flashrank/onnxruntime, Ollama embeddings) are imported inside
+# the factories below so only the configured path pays their import cost.
+
+def _doc_id(doc: Document) -> str:
+    """Stable id for a chunk: explicit id, else doc_hash + element_index, else a hash of its text."""
+    metadata = doc.metadata or {}
+    if metadata.get("id"):
+        return str(metadata["id"])
+    if metadata.get("doc_hash"):
+        return f"{metadata['doc_hash']}:{metadata.get('element_index', '')}"
+    return hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+
+class RerankerWithCache(BaseDocumentCompressor):
+    """Wraps a reranker and memoizes its scores per (sha1(query), doc id).
+
+    Repeated queries only send unseen chunks through the cross-encoder.
+    The wrapped compressor must put its score in metadata['relevance_score'] (FlashrankRerank does).
+    """
+
+    base_compressor: BaseDocumentCompressor
+    top_n: int = 3
+    maxsize: int = 4096
+    _scores: "OrderedDict[Tuple[str, str], float]" = PrivateAttr(default_factory=OrderedDict)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def _get_score(self, key: Tuple[str, str]) -> Optional[float]:
+        with self._lock:
+            score = self._scores.get(key)
+            if score is not None:
+                self._scores.move_to_end(key)
+            return score
+
+    def _put_score(self, key: Tuple[str, str], score: float) -> None:
+        with self._lock:
+            self._scores[key] = score
+            self._scores.move_to_end(key)
+            while len(self._scores) > self.maxsize:
+                self._scores.popitem(last=False)
+
+    def compress_documents(self, documents: Sequence[Document], query: str, callbacks: Optional[Callbacks] = None) -> Sequence[Document]:
+        query_hash = hashlib.sha1(query.encode("utf-8")).hexdigest()
+        scored: List[Tuple[float, Document]] = []
+        misses: List[Document] = []
+        for doc in documents:
+            score = self._get_score((query_hash, _doc_id(doc)))
+            if score is None:
+                misses.append(doc)
+            else:
+                scored.append((score, doc))
+
+        if misses:
+            for doc in self.base_compressor.compress_documents(misses, query, callbacks=callbacks):
+                score = doc.metadata.get("relevance_score")
+                if score is None:
+                    continue
+                score = float(score)
+                self._put_score((query_hash, _doc_id(doc)), score)
+                scored.append((score, doc))
+
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        return [
+            Document(page_content=doc.page_content, metadata={**doc.metadata, "relevance_score": score})
+            for score, doc in scored[:self.top_n]
+        ]
+
 # Add back create_embeddings function
+# Cached so every caller shares one client (and its connection pool) per process.
+@lru_cache(maxsize=1)
 def create_embeddings() -> Embeddings:
     """Creates the embedding model instance based on configuration."""
     provider = Config.Embedding.PROVIDER.lower()
@@ -14,10 +87,12 @@ def create_embeddings() -> Embeddings:
     print(f"Creating embeddings: Provider='{provider}', Model='{model_name}'")
 
     if provider == "ollama":
-        return OllamaEmbeddings(model=model_name)
+        from .embeddings import CachedOllamaEmbeddings
+        return CachedOllamaEmbeddings(model=model_name)
     else:
         raise ValueError(f"Unsupported embedding provider: {provider}")
 
+@lru_cache(maxsize=1)
 def create_llm() -> BaseLanguageModel:
     """Creates the LLM instance based on configuration."""
     provider = Config.LLM.PROVIDER.lower()
@@ -30,6 +105,16 @@ def create_llm() -> BaseLanguageModel:
         if not groq_api_key:
             raise ValueError("Groq provider requires GROQ_API_KEY in environment variables (.env)")
         try:
+            if Config.LLM.USE_NATIVE_GROQ:
+                from .groq_native import GroqNativeChatModel
+                llm = GroqNativeChatModel(
+                    api_key=groq_api_key,
+                    temperature=temperature,
+                    model_name=model_name
+                )
+                print(f"Native Groq LLM created successfully (Model: {model_name})")
+                return llm
+            from langchain_groq import ChatGroq
             llm = ChatGroq(
                 api_key=groq_api_key,
                 temperature=temperature,
@@ -44,3 +129,37 @@ def create_llm() -> BaseLanguageModel:
     else:
         raise ValueError(f"Unsupported LLM provider: {provider}")
 
+@lru_cache(maxsize=1)
+def create_reranker() -> BaseDocumentCompressor:
+    """Creates the (score-cached) Flashrank reranker used to reorder retrieved chunks."""
+    print(f"Creating reranker: Flashrank, top_n={Config.Retriever.SEARCH_K}")
+    # The inner reranker scores every candidate so each score can be cached; the wrapper trims to top_n.
+    from langchain_community.document_compressors.flashrank_rerank import FlashrankRerank
+    reranker = FlashrankRerank(top_n=Config.Retriever.RERANK_CANDIDATES)
+    return RerankerWithCache(
+        base_compressor=reranker,
+        top_n=Config.Retriever.SEARCH_K,
+        maxsize=Config.Retriever.RERANK_CACHE_SIZE
+    )
+
+async def warm_up_models(include_embeddings: bool = False) -> None:
+    """Builds the cached model clients and sends each a tiny request so the first user query skips cold start.
+
+    Failures are logged and swallowed; the app still serves requests lazily.
+    """
+    tasks = []
+    try:
+        # One-token completion: opens the provider connection (and loads weights on local backends).
+        tasks.append(create_llm().bind(max_tokens=1).ainvoke("ok"))
+        if include_embeddings:
+            # Only the local FAISS path embeds queries client-side; Weaviate vectorizes server-side.
+            tasks.append(create_embeddings().aembed_query("warmup"))
+    except Exception as e:
+        print(f"WARNING: Could not create models for warm-up: {e}")
+        return
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"WARNING: Model warm-up request failed: {result}")
+    print(f"Model warm-up finished ({len(tasks)} request(s)).")
+
@@ -1,20 +1,134 @@
+import re
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence
+from langchain.retrievers import ContextualCompressionRetriever
+from langchain.retrievers.document_compressors import LLMChainFilter
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import BaseDocumentCompressor, Document
 from langchain_core.language_models import BaseLanguageModel
-import weaviate
+from langchain_core.runnables import RunnableConfig
 from .config import Config
 from dotenv import load_dotenv
 from langchain_core.retrievers import BaseRetriever
 # FAISS/Local imports
 from langchain_community.vectorstores import FAISS
-import os
+import pickle
+from pathlib import Path
 # Use relative import for model
-from .model import create_embeddings
+from .model import _doc_id, create_embeddings, create_reranker
+
+if TYPE_CHECKING: # Only needed for the type hint; weaviate is heavy to import
+    import weaviate
 
 load_dotenv()
 
+# Loaded FAISS stores keyed by index path, with the index file's mtime at load time, so each
+# retriever call doesn't re-read the index but a re-ingested index is picked up on the next call.
+_FAISS_CACHE: dict[str, tuple[float, FAISS]] = {}
+
+def _index_mtime(faiss_index_path: str) -> float:
+    try:
+        return (Path(faiss_index_path) / "index.faiss").stat().st_mtime
+    except OSError:
+        return 0.0 # Missing index
+
+def clear_faiss_cache() -> None:
+    """Drops cached FAISS stores. Call after (re)ingesting into the local index."""
+    _FAISS_CACHE.clear()
+
+_FUSED_SCORE_LINE = re.compile(r"doc_(\d+)\s*[:=]\s*(\d+(?:\.\d+)?)")
+
+class FusedRerankFilter(BaseDocumentCompressor):
+    """Reranks and filters in one LLM call instead of a reranker pass plus a per-document filter pass.
+
+    Documents are listed in a fixed order (by doc id) ahead of the query, so the prompt prefix
+    is identical across queries over the same candidates and the provider's prompt cache can reuse it.
+    The model answers one "doc_i: score" line per document; docs below min_score are dropped.
+    """
+
+    llm: BaseLanguageModel
+    top_n: int = 3
+    min_score: float = 5.0
+
+    def _build_prompt(self, documents: Sequence[Document], query: str) -> str:
+        parts = [f"[doc_{i}]\n{doc.page_content}" for i, doc in enumerate(documents)]
+        parts.append(f"Query: {query}")
+        parts.append(
+            "Score how relevant each document is to the query from 0 to 10. "
+            "Answer with one line per document in the form 'doc_<number>: <score>' and nothing else."
+        )
+        return "\n\n".join(parts)
+
+    def _select(self, documents: Sequence[Document], output) -> List[Document]:
+        text = getattr(output, "content", output)
+        scores: Dict[int, float] = {}
+        for doc_index, score in _FUSED_SCORE_LINE.findall(str(text)):
+            scores[int(doc_index)] = float(score)
+        ranked = sorted(
+            ((score, i) for i, score in scores.items() if i < len(documents) and score >= self.min_score),
+            reverse=True
+        )
+        return [
+            Document(page_content=documents[i].page_content, metadata={**documents[i].metadata, "relevance_score": score})
+            for score, i in ranked[:self.top_n]
+        ]
+
+    def compress_documents(self, documents: Sequence[Document], query: str, callbacks: Optional[Callbacks] = None) -> Sequence[Document]:
+        if not documents:
+            return []
+        documents = sorted(documents, key=_doc_id)
+        output = self.llm.bind(max_tokens=8 * len(documents)).invoke(
+            self._build_prompt(documents, query), config=RunnableConfig(callbacks=callbacks)
+        )
+        return self._select(documents, output)
+
+    async def acompress_documents(self, documents: Sequence[Document], query: str, callbacks: Optional[Callbacks] = None) -> Sequence[Document]:
+        if not documents:
+            return []
+        documents = sorted(documents, key=_doc_id)
+        output = await self.llm.bind(max_tokens=8 * len(documents)).ainvoke(
+            self._build_prompt(documents, query), config=RunnableConfig(callbacks=callbacks)
+        )
+        return self._select(documents, output)
+
+def _load_faiss_store(faiss_index_path: str) -> FAISS:
+    """Loads a saved FAISS store with the index memory-mapped read-only.
+
+    Equivalent to FAISS.load_local, but pages are demand-loaded from the OS page cache
+    and shared between uvicorn workers instead of being copied into each process.
+    """
+    import faiss
+    index_dir = Path(faiss_index_path)
+    index = faiss.read_index(str(index_dir / "index.faiss"), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    with open(index_dir / "index.pkl", "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    vector_store = FAISS(create_embeddings(), index, docstore, index_to_docstore_id)
+    # Cap OpenMP threads per process so several uvicorn workers don't oversubscribe the CPU.
+    faiss.omp_set_num_threads(Config.Retriever.FAISS_OMP_THREADS)
+
+    # IVF indexes (e.g. built with index_factory(d, "IVF256,PQ32")) search only nprobe lists.
+    # extract_index_ivf also reaches the IVF layer under a rotation, e.g. "OPQ32_128,IVF1024,PQ32",
+    # where the top-level object is an IndexPreTransform without an nprobe of its own.
+    try:
+        ivf_index = faiss.extract_index_ivf(index)
+    except RuntimeError: # Not an IVF index
+        ivf_index = None
+    if ivf_index is not None:
+        ivf_index.nprobe = Config.Retriever.FAISS_NPROBE
+        print(f"Retriever: IVF index detected ({type(ivf_index).__name__}), nprobe={Config.Retriever.FAISS_NPROBE}.")
+    # HNSW graphs (IndexHNSWFlat(d, 32) / index_factory(d, "HNSW32")) visit efSearch candidates per query.
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = Config.Retriever.FAISS_EF_SEARCH
+        print(f"Retriever: HNSW index detected, efSearch={Config.Retriever.FAISS_EF_SEARCH}.")
+    if Config.Retriever.USE_SQ8:
+        if not isinstance(index, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+            print(f"WARNING: FAISS_USE_SQ8 is set but the index at {faiss_index_path} is "
+                  f"{type(index).__name__}. Rebuild it with index_factory(d, 'SQ8').")
+    return vector_store
+
 # --- Updated create_retriever function (FAISS ONLY) --- 
 def create_retriever(
         llm: BaseLanguageModel, 
-        client: weaviate.Client | None = None # Keep for signature consistency
+        client: "weaviate.Client | None" = None # Keep for signature consistency
 ) -> BaseRetriever | None: # Return None if not local
     """Creates a retriever ONLY for the local FAISS setup."""
     
@@ -22,22 +136,48 @@ def create_retriever(
         # --- FAISS Retriever --- 
         print("Retriever: Creating FAISS retriever...")
         faiss_index_path = str(Config.Path.FAISS_INDEX_DIR / "docs_index")
-        if not os.path.exists(faiss_index_path):
-            print(f"ERROR: FAISS index not found at {faiss_index_path}. Please run ingestion first.")
-            return None 
         try:
-            embeddings = create_embeddings()
-            vector_store = FAISS.load_local(
-                faiss_index_path, 
-                embeddings, 
-                allow_dangerous_deserialization=True
-            )
+            mtime = _index_mtime(faiss_index_path)
+            if mtime == 0.0:
+                print(f"ERROR: FAISS index not found at {faiss_index_path}. Please run ingestion first.")
+                return None
+            cached = _FAISS_CACHE.get(faiss_index_path)
+            if cached is not None and cached[0] == mtime:
+                vector_store = cached[1]
+            else:
+                vector_store = _load_faiss_store(faiss_index_path)
+                _FAISS_CACHE[faiss_index_path] = (mtime, vector_store)
+            search_k = Config.Retriever.RERANK_CANDIDATES if Config.Retriever.USE_RERANKER else Config.Retriever.SEARCH_K
+            # "hybrid" is served natively by Weaviate; FAISS has no sparse index, so use plain similarity
+            search_type = "similarity" if Config.Retriever.SEARCH_TYPE == "hybrid" else Config.Retriever.SEARCH_TYPE
             retriever = vector_store.as_retriever(
-                search_type=Config.Retriever.SEARCH_TYPE, 
-                search_kwargs={'k': Config.Retriever.SEARCH_K}
+                search_type=search_type, 
+                search_kwargs={'k': search_k}
             )
-            print(f"Retriever: Loaded FAISS index and created retriever with k={Config.Retriever.SEARCH_K}.")
+            print(f"Retriever: Loaded FAISS index and created retriever with k={search_k}.")
+            compressor = None
+            if Config.Retriever.USE_RERANKER and Config.Retriever.USE_CHAIN_FILTER:
+                # One LLM call both ranks and filters, instead of two compression passes.
+                # The LLM's scores replace Flashrank here: create_reranker() is not used in this mode.
+                compressor = FusedRerankFilter(
+                    llm=llm,
+                    top_n=Config.Retriever.SEARCH_K,
+                    min_score=Config.Retriever.RERANK_MIN_SCORE
+                )
+            elif Config.Retriever.USE_RERANKER:
+                compressor = create_reranker()
+            elif Config.Retriever.USE_CHAIN_FILTER:
+                compressor = LLMChainFilter.from_llm(llm) # Already batches its per-document LLM calls
+            if compressor is not None:
+                retriever = ContextualCompressionRetriever(
+                    base_compressor=compressor,
+                    base_retriever=retriever
+                )
+                print(f"Retriever: Wrapped retriever with {type(compressor).__name__}.")
             return retriever
+        except FileNotFoundError as e: # index.faiss exists but index.pkl doesn't
+            print(f"ERROR: FAISS index at {faiss_index_path} is incomplete. Please run ingestion first. ({e})")
+            return None
         except Exception as e:
             print(f"ERROR loading FAISS index or creating retriever: {e}")
             return None
@@ -1,9 +1,15 @@
 # backend/ragbase/utils.py
 import hashlib
-import json
+import os
+import orjson
 from pathlib import Path
 from typing import Dict
 
+try:
+    from blake3 import blake3 # Optional: SIMD-parallel and much faster than SHA256 on large files
+except ImportError:
+    blake3 = None
+
 try:
     from .config import Config
     HASH_FILE_PATH = Path(Config.Path.PROCESSED_HASHES_FILE)
@@ -12,16 +18,21 @@ except ImportError:
     HASH_FILE_PATH = Path(__file__).parent.parent / "processed_hashes.json" 
 
 def calculate_file_hash(file_path: Path) -> str:
-    """Calculates the SHA256 hash of a file."""
-    hasher = hashlib.sha256()
+    """Calculates the BLAKE3 hash of a file if blake3 is installed, otherwise SHA256.
+
+    Both are 64 hex characters, so the hash file format is unchanged. Switching algorithms
+    changes every stored value though, so existing files are reprocessed once.
+    """
     try:
+        if blake3 is not None:
+            return blake3().update_mmap(str(file_path)).hexdigest()
         with open(file_path, 'rb') as file:
-            while True:
-                chunk = file.read(4096)
-                if not chunk:
-                    break
+            if hasattr(hashlib, "file_digest"): # Python 3.11+: digest loop runs in C
+                return hashlib.file_digest(file, "sha256").hexdigest()
+            hasher = hashlib.sha256()
+            while chunk := file.read(1024 * 1024):
                 hasher.update(chunk)
-        return hasher.hexdigest()
+            return hasher.hexdigest()
     except IOError as e:
         print(f"Error reading file for hashing {file_path}: {e}")
         return ""
@@ -30,24 +41,28 @@ def load_processed_hashes() -> Dict[str, str]:
     """Loads the dictionary of processed file hashes from the JSON file."""
     if HASH_FILE_PATH.exists():
         try:
-            with open(HASH_FILE_PATH, 'r') as f:
-                data = json.load(f)
-                if isinstance(data, dict):
-                    return data
-                else:
-                    print(f"Warning: Hash file {HASH_FILE_PATH} does not contain a dictionary. Starting fresh.")
-                    return {}
-        except (json.JSONDecodeError, IOError) as e:
+            data = orjson.loads(HASH_FILE_PATH.read_bytes())
+            if isinstance(data, dict):
+                return data
+            else:
+                print(f"Warning: Hash file {HASH_FILE_PATH} does not contain a dictionary. Starting fresh.")
+                return {}
+        except (orjson.JSONDecodeError, IOError) as e:
             print(f"Warning: Could not load or parse hash file {HASH_FILE_PATH}. Starting fresh. Error: {e}")
             return {}
     return {}
 
 def save_processed_hashes(hashes: Dict[str, str]):
-    """Saves the dictionary of processed file hashes to the JSON file."""
+    """Saves the dictionary of processed file hashes to the JSON file.
+
+    Writes a temp file and renames it over the old one, so a crash mid-write never leaves a
+    truncated hash file (which load_processed_hashes would discard, reprocessing everything).
+    """
+    tmp_path = HASH_FILE_PATH.with_name(HASH_FILE_PATH.name + ".tmp")
     try:
         # Ensure the directory exists
         HASH_FILE_PATH.parent.mkdir(parents=True, exist_ok=True)
-        with open(HASH_FILE_PATH, 'w') as f:
-            json.dump(hashes, f, indent=4)
+        tmp_path.write_bytes(orjson.dumps(hashes, option=orjson.OPT_INDENT_2))
+        os.replace(tmp_path, HASH_FILE_PATH)
     except IOError as e:
         print(f"Error: Could not save hash file {HASH_FILE_PATH}. Error: {e}") 
\ No newline at end of file